@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
@@ -24,6 +25,12 @@ router = APIRouter()
 groq_service = GroqAcademicService()
 
 
+@router.on_event("startup")
+async def warm_up_groq_service():
+    """Resolve ChromaDB handles and the project context before the first chat request"""
+    await run_in_threadpool(groq_service.warm_up)
+
+
 @router.get("", response_model=List[ConversationResponse])
 async def get_conversations(
     assistant_type: str = None,
@@ -182,11 +189,13 @@ async def add_message(
                 for msg in history_messages[:-1]  # Exclude the just-added message
             ]
             
-            # Get AI response
-            ai_response = groq_service.chat(
+            # Get AI response (blocking Groq/ChromaDB calls run off the event loop)
+            ai_response = await run_in_threadpool(
+                groq_service.chat,
                 user_message=message.content,
                 conversation_history=conversation_history,
-                include_courses=True
+                include_courses=True,
+                language=message.language
             )
             
             # Save AI response
@@ -221,10 +230,12 @@ async def add_message(
                 for msg in history_messages[:-1]
             ]
             
-            # Get AI response using social assistant
-            ai_response = groq_service.chat_social(
+            # Get AI response using social assistant (off the event loop)
+            ai_response = await run_in_threadpool(
+                groq_service.chat_social,
                 user_message=message.content,
-                conversation_history=conversation_history
+                conversation_history=conversation_history,
+                language=message.language
             )
             
             # Save AI response
@@ -282,8 +293,8 @@ async def add_message_stream(
     
     db.commit()
     
-    # Stream AI response for academic assistant
-    if message.role == "user" and conversation.assistant_type == "academic":
+    # Stream AI response for academic and social assistants
+    if message.role == "user" and conversation.assistant_type in ("academic", "social"):
         try:
             # Get conversation history
             history_messages = db.query(Message).filter(
@@ -295,14 +306,25 @@ async def add_message_stream(
                 for msg in history_messages[:-1]
             ]
             
+            if conversation.assistant_type == "academic":
+                response_stream = groq_service.chat_stream(
+                    user_message=message.content,
+                    conversation_history=conversation_history,
+                    include_courses=True,
+                    language=message.language
+                )
+            else:
+                response_stream = groq_service.chat_social_stream(
+                    user_message=message.content,
+                    conversation_history=conversation_history,
+                    language=message.language
+                )
+            
             async def generate():
                 full_response = ""
                 
-                for chunk in groq_service.chat_stream(
-                    user_message=message.content,
-                    conversation_history=conversation_history,
-                    include_courses=True
-                ):
+                # Each blocking step of the sync generator runs in the threadpool
+                async for chunk in iterate_in_threadpool(response_stream):
                     full_response += chunk
                     yield f"data: {json.dumps({'content': chunk})}\n\n"
                 
@@ -7,6 +7,8 @@ import psycopg2
 import os
 import re
 
+from app.core.vector_store import DISTANCE_SPACE, EMBEDDING_MODEL_NAME, collection_metadata
+
 router = APIRouter()
 
 # Configuration
@@ -19,7 +21,7 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "sage_user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "sage_password")
 
 # Embedding model
-MODEL_NAME = "intfloat/e5-large-v2"
+MODEL_NAME = EMBEDDING_MODEL_NAME
 model = None
 chroma_client = None
 chroma_collection = None
@@ -39,10 +41,18 @@ def get_chroma_collection():
             host=CHROMA_HOST,
             port=CHROMA_PORT
         )
-        chroma_collection = chroma_client.get_or_create_collection(
-            name="tedu_courses",
-            metadata={"hnsw:space": "cosine"}  # Use cosine similarity
-        )
+        try:
+            # Opened as is: get_or_create_collection would overwrite the metadata
+            # without changing the index the collection was built with
+            chroma_collection = chroma_client.get_collection("tedu_courses")
+            if (chroma_collection.metadata or {}).get("hnsw:space") != DISTANCE_SPACE:
+                print("⚠️  tedu_courses was not built with cosine distance; "
+                      "run scripts/create_course_embeddings.py to rebuild it")
+        except Exception:
+            chroma_collection = chroma_client.get_or_create_collection(
+                name="tedu_courses",
+                metadata=collection_metadata({"hnsw:space": "cosine"})  # Use cosine similarity
+            )
     return chroma_collection
 
 def get_db_connection():
@@ -151,7 +161,7 @@ async def search_courses(request: CourseSearchRequest):
         else:
             enhanced_query = f"query: {request.query}"
             
-        query_embedding = model.encode([enhanced_query])[0].tolist()
+        query_embedding = model.encode([enhanced_query], normalize_embeddings=True)[0].tolist()
         
         # Build where filter for department if specified
         where_filter = None
@@ -90,9 +90,11 @@ async def fetch_emails_imap(request: FetchEmailsRequest):
         raise HTTPException(status_code=401, detail="Not authenticated. Please login first.")
     
     try:
+        # The inbox listing shows every recent email, not only event candidates
         emails = imap_service.fetch_emails(
             days=request.days,
-            max_results=request.max_results
+            max_results=request.max_results,
+            keywords=None
         )
         
         return {
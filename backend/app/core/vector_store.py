@@ -0,0 +1,40 @@
+"""
+Shared ChromaDB collection settings
+"""
+import os
+from typing import Dict
+
+# Sentence embedding model for indexing and querying. Collections must be queried with
+# the model that built them: after changing SAGE_EMBEDDING_MODEL (e.g. to the faster
+# 384-dim intfloat/multilingual-e5-small) re-run every create_*_embeddings script
+EMBEDDING_MODEL_NAME = os.getenv("SAGE_EMBEDDING_MODEL", "intfloat/e5-large-v2")
+
+# Dining and entertainment places share one collection; metadata "venue_type"
+# ("dining" / "entertainment") tells them apart
+VENUES_COLLECTION = "venues"
+
+# HNSW index parameters applied when a collection is created, sized for
+# 1024-dim E5-large vectors (smaller models can use a lower M). Existing collections keep the parameters they were
+# built with until they are recreated by the embedding scripts.
+HNSW_PARAMS = {
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "24")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "128")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "100")),
+}
+
+
+# Vector precision: Chroma 0.4.x (hnswlib) stores and searches float32 only, so
+# E5-large vectors cost 4 KB each in the index. Rounding them to float16 before
+# insertion would lose precision without shrinking the index; halving its memory
+# footprint needs a store with native half-precision vectors (e.g. pgvector halfvec).
+
+
+# Distance metric for every collection. Embeddings are L2-normalized at encode time and
+# the service reports relevance as 1 - distance, which is cosine similarity only in
+# cosine space (Chroma's default l2 space returns squared L2 = 2 - 2 * cosine)
+DISTANCE_SPACE = "cosine"
+
+
+def collection_metadata(metadata: Dict) -> Dict:
+    """Collection metadata with the distance space and HNSW index parameters merged in"""
+    return {"hnsw:space": DISTANCE_SPACE, **HNSW_PARAMS, **metadata}
@@ -9,7 +9,7 @@ class MessageBase(BaseModel):
 
 
 class MessageCreate(MessageBase):
-    pass
+    language: Optional[str] = None  # UI locale ('tr' / 'en'); detected from content when omitted
 
 
 class MessageResponse(MessageBase):
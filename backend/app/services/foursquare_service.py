@@ -4,7 +4,7 @@ Service for fetching restaurant and entertainment venue data from Foursquare API
 import os
 import requests
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, TypedDict
 from math import radians, cos, sin, asin, sqrt
 
 logger = logging.getLogger(__name__)
@@ -19,6 +19,22 @@ FOURSQUARE_API_KEY = os.getenv("FSQ_API_KEY")  # Bearer token for v3 API
 FOURSQUARE_CLIENT_ID = os.getenv("FSQ_CLIENT_ID")
 FOURSQUARE_CLIENT_SECRET = os.getenv("FSQ_CLIENT_SECRET")
 
+# v3 Places API endpoint
+FOURSQUARE_SEARCH_URL = "https://places-api.foursquare.com/places/search"
+
+# Maximum results the v3 search endpoint returns per request
+FOURSQUARE_MAX_LIMIT = 50
+
+# Shared session so all category requests reuse one keep-alive TLS connection.
+# The host is resolved when the pooled connection is opened, not per request,
+# so we don't pin IPs (that would bypass DNS failover and break TLS SNI).
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    'accept': 'application/json',
+    'authorization': f'Bearer {FOURSQUARE_API_KEY}',
+    'X-Places-Api-Version': '2025-06-17'
+})
+
 # Category IDs for filtering
 DINING_CATEGORIES = [
     "4d4b7105d754a06374d81259",  # Restaurant
@@ -44,6 +60,53 @@ CATEGORY_NAMES = {
     "4bf58dd8d48988d1e2931735": "art_gallery",
 }
 
+# Foursquare's 1-4 price scale mapped onto our 1-5 scale (index = tier)
+_PRICE_TIERS = (
+    None,
+    '₺₺',       # Cheap
+    '₺₺₺',      # Moderate
+    '₺₺₺₺',     # Expensive
+    '₺₺₺₺₺',    # Very Expensive
+)
+
+# (feature group, feature key, tag) lookups applied to v3 venue features
+_FEATURE_TAGS = (
+    ('payment', 'credit_cards', 'credit_cards'),
+    ('food_and_drink', 'alcohol', 'alcohol'),
+    ('amenities', 'wifi', 'wifi'),
+    ('amenities', 'parking', 'parking'),
+)
+
+# Shared read-only fallback for missing nested dicts
+_EMPTY = {}
+
+
+class VenueRecord(TypedDict):
+    """Shape of a parsed v3 venue as consumed by the ingestion scripts"""
+    name: str
+    category: str
+    categories: List[str]
+    fsq_id: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    distance_from_campus: Optional[float]
+    address: Optional[str]
+    locality: Optional[str]
+    region: Optional[str]
+    postcode: Optional[str]
+    country: str
+    phone: Optional[str]
+    website: Optional[str]
+    email: Optional[str]
+    description: Optional[str]
+    rating: Optional[float]
+    price: Optional[str]
+    opening_hours: None
+    photos: List[str]
+    tags: List[str]
+    verified: bool
+    hours: Dict[str, Any]
+
 
 def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
     """
@@ -75,28 +138,23 @@ def format_price_range(price_tier: int) -> str:
     if not price_tier or price_tier < 1:
         return None
     
-    # Map Foursquare's 1-4 scale to our 1-5 scale
-    price_map = {
-        1: '₺₺',      # Cheap
-        2: '₺₺₺',     # Moderate
-        3: '₺₺₺₺',    # Expensive
-        4: '₺₺₺₺₺'    # Very Expensive
-    }
+    if price_tier > 4:
+        return '₺₺₺'  # Default to moderate
     
-    return price_map.get(price_tier, '₺₺₺')  # Default to moderate
+    return _PRICE_TIERS[price_tier]
 
 
 def fetch_venues_from_foursquare(
     venue_type: str = "dining",
     limit: int = 50
-) -> List[Dict[str, Any]]:
+) -> List[VenueRecord]:
     """
     Fetch venues from Foursquare API using OAuth credentials
     Fetches limit venues for EACH category separately
     
     Args:
         venue_type: Type of venues to fetch - "dining" or "entertainment"
-        limit: Maximum number of results PER CATEGORY (default: 50)
+        limit: Maximum number of results PER CATEGORY (default: 50, capped at FOURSQUARE_MAX_LIMIT)
         
     Returns:
         List of venue dictionaries with Foursquare data
@@ -115,35 +173,33 @@ def fetch_venues_from_foursquare(
         logger.error(f"Invalid venue type: {venue_type}")
         return []
     
+    limit = min(limit, FOURSQUARE_MAX_LIMIT)
+    
     all_venues = []
+    # Bind hot-loop lookups to locals once
+    parse_venue = parse_foursquare_venue_v3
+    category_name_for = CATEGORY_NAMES.get
     # We want to store same venue multiple times with different category labels
     # So don't deduplicate here - let database handle it with composite key
     
-    # Fetch venues for each category separately
+    # Build query parameters for v3 Places API once; only the category changes per request
+    params = {
+        "ll": f"{CAMPUS_LAT},{CAMPUS_LON}",
+        "limit": limit,
+        "sort": "DISTANCE",  # Sort by distance (no radius limit)
+    }
+    
+    # Fetch venues for each category separately. A single comma-joined
+    # fsq_category_ids request would share one 50-result cap across all
+    # categories and only returns leaf categories, losing our labels.
     for category_id in categories:
-        category_name = CATEGORY_NAMES.get(category_id, category_id)
+        category_name = category_name_for(category_id, category_id)
         logger.info(f"Fetching {limit} venues for category: {category_name} ({category_id})...")
         
-        # Build query parameters for v3 Places API
-        params = {
-            "ll": f"{CAMPUS_LAT},{CAMPUS_LON}",
-            "fsq_category_ids": category_id,  # Category filter (correct parameter name)
-            "limit": limit,
-            "sort": "DISTANCE",  # Sort by distance (no radius limit)
-        }
-        
-        # Use v3 Places API endpoint
-        search_url = "https://places-api.foursquare.com/places/search"
-        
-        # Set headers for v3 API with Bearer token
-        headers = {
-            'accept': 'application/json',
-            'authorization': f'Bearer {FOURSQUARE_API_KEY}',
-            'X-Places-Api-Version': '2025-06-17'
-        }
+        params["fsq_category_ids"] = category_id  # Category filter (correct parameter name)
         
         try:
-            response = requests.get(search_url, params=params, headers=headers, timeout=30)
+            response = _SESSION.get(FOURSQUARE_SEARCH_URL, params=params, timeout=30)
             
             # Log response details for debugging
             if response.status_code != 200:
@@ -151,19 +207,24 @@ def fetch_venues_from_foursquare(
                 logger.error(f"API Response Body: {response.text}")
                 continue
             
-            response.raise_for_status()
-            
             data = response.json()
             # v3 API returns results directly, not nested in 'response'
-            venues_list = data.get('results', [])
+            venues_list = data.get('results', []) if isinstance(data, dict) else None
+            if not isinstance(venues_list, list):
+                logger.error(f"Unexpected response shape for {category_name}: {type(data).__name__}")
+                continue
             
-            logger.info(f"  -> Found {len(venues_list)} venues for {category_name}")
+            # Parse v3 API venue format with the requested category, skipping
+            # malformed entries so one bad item doesn't abort the category.
+            # Don't skip duplicates - same venue will be stored with different categories
+            category_start = len(all_venues)
+            all_venues.extend(
+                parse_venue(venue, requested_category=category_name)
+                for venue in venues_list
+                if isinstance(venue, dict)
+            )
             
-            for venue in venues_list:
-                # Parse v3 API venue format with the requested category
-                # Don't skip duplicates - same venue will be stored with different categories
-                venue_data = parse_foursquare_venue_v3(venue, requested_category=category_name)
-                all_venues.append(venue_data)
+            logger.info(f"  -> Found {len(all_venues) - category_start} venues for {category_name}")
             
         except requests.RequestException as e:
             logger.error(f"Error fetching {category_name}: {e}")
@@ -176,7 +237,7 @@ def fetch_venues_from_foursquare(
     return all_venues
 
 
-def parse_foursquare_venue_v3(venue: Dict[str, Any], requested_category: str = None) -> Dict[str, Any]:
+def parse_foursquare_venue_v3(venue: Dict[str, Any], requested_category: str = None) -> VenueRecord:
     """Parse a Foursquare v3 Places API venue result into our format
     
     Args:
@@ -184,74 +245,75 @@ def parse_foursquare_venue_v3(venue: Dict[str, Any], requested_category: str = N
         requested_category: The category we requested (e.g., 'restaurant', 'cafe')
     """
     
-    # Extract location data - v3 has lat/lon directly on venue, OR distance if provided
-    lat = venue.get('latitude')
-    lon = venue.get('longitude')
+    vget = venue.get
     
-    # Use distance from API if available (in meters), convert to km
-    distance = venue.get('distance')
-    if distance is not None:
-        distance = round(distance / 1000, 2)  # Convert meters to km
-    elif lat and lon:
-        # Calculate distance if not provided
-        distance = haversine(CAMPUS_LON, CAMPUS_LAT, lon, lat)
-        distance = round(distance, 2)
-    
-    # Get primary category - v3 uses fsq_category_id
-    categories = venue.get('categories', [])
-    primary_category = categories[0] if categories else {}
-    category_id = primary_category.get('fsq_category_id')  # v3 field name
+    # Extract location data - v3 has lat/lon directly on venue, OR distance if provided
+    lat = vget('latitude')
+    lon = vget('longitude')
+    distance = _distance_from_campus_v3(venue, lat, lon)
     
-    # Use requested category if provided, otherwise detect from venue
-    if requested_category:
-        category_name = requested_category
-    else:
-        category_name = CATEGORY_NAMES.get(category_id, 'other')
+    # Use requested category if provided, otherwise detect from primary category
+    categories = vget('categories') or ()
+    category_name = requested_category or _primary_category_name_v3(categories)
     
     # Get all category names
     category_list = [cat.get('name', '') for cat in categories]
     
     # Extract location details
-    location = venue.get('location', {})
-    address_parts = []
-    if location.get('address'):
-        address_parts.append(location['address'])
-    if location.get('locality'):
-        address_parts.append(location['locality'])
-    if location.get('region'):
-        address_parts.append(location['region'])
+    location = vget('location') or _EMPTY
+    lget = location.get
+    locality = lget('locality')
+    region = lget('region')
+    formatted_address = ', '.join(filter(None, (lget('address'), locality, region))) or None
     
-    formatted_address = ', '.join(address_parts) if address_parts else None
+    price = vget('price')
     
-    venue_data = {
-        'name': venue.get('name', 'Unnamed'),
+    venue_data: VenueRecord = {
+        'name': vget('name', 'Unnamed'),
         'category': category_name,
         'categories': category_list,
-        'fsq_id': venue.get('fsq_place_id'),  # v3 uses fsq_place_id
+        'fsq_id': vget('fsq_place_id'),  # v3 uses fsq_place_id
         'latitude': lat,
         'longitude': lon,
         'distance_from_campus': distance,
         'address': formatted_address,
-        'locality': location.get('locality'),
-        'region': location.get('region'),
-        'postcode': location.get('postcode'),
-        'country': location.get('country', 'TR'),
-        'phone': venue.get('tel'),
-        'website': venue.get('website'),
-        'email': venue.get('email'),
-        'description': venue.get('description'),
-        'rating': venue.get('rating'),
-        'price': format_price_range(venue.get('price')) if venue.get('price') else None,
+        'locality': locality,
+        'region': region,
+        'postcode': lget('postcode'),
+        'country': lget('country', 'TR'),
+        'phone': vget('tel'),
+        'website': vget('website'),
+        'email': vget('email'),
+        'description': vget('description'),
+        'rating': vget('rating'),
+        'price': format_price_range(price) if price else None,
         'opening_hours': None,  # Would need separate details call
         'photos': [],  # Would need separate photos call
         'tags': extract_tags_v3(venue),
-        'verified': venue.get('verified', False),
-        'hours': venue.get('hours', {})
+        'verified': vget('verified', False),
+        'hours': vget('hours', {})
     }
     
     return venue_data
 
 
+def _distance_from_campus_v3(venue: Dict[str, Any], lat: float, lon: float) -> Optional[float]:
+    """Distance from campus in km, preferring the API-provided distance (meters)"""
+    distance = venue.get('distance')
+    if distance is not None:
+        return round(distance / 1000, 2)  # Convert meters to km
+    if lat and lon:
+        # Calculate distance if not provided
+        return round(haversine(CAMPUS_LON, CAMPUS_LAT, lon, lat), 2)
+    return None
+
+
+def _primary_category_name_v3(categories: List[Dict[str, Any]]) -> str:
+    """Map the venue's primary v3 category (fsq_category_id) to our category name"""
+    category_id = categories[0].get('fsq_category_id') if categories else None
+    return CATEGORY_NAMES.get(category_id, 'other')
+
+
 def extract_tags_v3(venue: Dict[str, Any]) -> List[str]:
     """Extract useful tags from v3 API venue data"""
     tags = []
@@ -261,228 +323,21 @@ def extract_tags_v3(venue: Dict[str, Any]) -> List[str]:
         tags.append('verified')
     
     # Add category tags
-    for cat in venue.get('categories', []):
+    for cat in venue.get('categories') or ():
         if cat.get('name'):
             tags.append(cat['name'].lower())
     
     # Add features/amenities
-    if venue.get('features'):
-        features = venue['features']
-        if features.get('payment', {}).get('credit_cards'):
-            tags.append('credit_cards')
-        if features.get('food_and_drink', {}).get('alcohol'):
-            tags.append('alcohol')
-        if features.get('amenities', {}).get('wifi'):
-            tags.append('wifi')
-        if features.get('amenities', {}).get('parking'):
-            tags.append('parking')
-    
-    return tags
-
-
-def parse_foursquare_venue_v2(venue: Dict[str, Any], requested_category: str = None) -> Dict[str, Any]:
-    """Parse a Foursquare v2 API venue result into our format
-    
-    Args:
-        venue: Foursquare v2 API venue object
-        requested_category: The category we requested (e.g., 'restaurant', 'cafe')
-    """
-    
-    # Extract location data
-    location = venue.get('location', {})
-    lat = location.get('lat')
-    lon = location.get('lng')
-    
-    # Calculate distance from campus
-    distance = None
-    if lat and lon:
-        distance = haversine(CAMPUS_LON, CAMPUS_LAT, lon, lat)
-        distance = round(distance, 2)
-    
-    # Get primary category
-    categories = venue.get('categories', [])
-    primary_category = categories[0] if categories else {}
-    category_id = primary_category.get('id')
-    
-    # Use requested category if provided, otherwise detect from venue
-    if requested_category:
-        category_name = requested_category
-    else:
-        category_name = CATEGORY_NAMES.get(category_id, 'other')
-    
-    # Get all category names
-    category_list = [cat.get('name', '') for cat in categories]
-    
-    # Extract location details
-    address_parts = []
-    if location.get('address'):
-        address_parts.append(location['address'])
-    if location.get('city'):
-        address_parts.append(location['city'])
-    if location.get('state'):
-        address_parts.append(location['state'])
-    
-    formatted_address = ', '.join(address_parts) if address_parts else None
-    
-    # Get venue stats if available
-    stats = venue.get('stats', {})
-    
-    venue_data = {
-        'name': venue.get('name', 'Unnamed'),
-        'category': category_name,
-        'categories': category_list,
-        'fsq_id': venue.get('id'),  # v2 uses 'id' not 'fsq_id'
-        'latitude': lat,
-        'longitude': lon,
-        'distance_from_campus': distance,
-        'address': formatted_address,
-        'locality': location.get('city'),
-        'region': location.get('state'),
-        'postcode': location.get('postalCode'),
-        'country': location.get('country', 'TR'),
-        'phone': venue.get('contact', {}).get('phone'),
-        'website': venue.get('url'),
-        'email': None,  # v2 API doesn't provide email
-        'description': None,  # Would need separate venue details call
-        'rating': venue.get('rating'),  # v2 has rating directly
-        'price': format_price_range(venue.get('price', {}).get('tier')) if 'price' in venue else None,
-        'opening_hours': None,  # Would need separate venue details call
-        'photos': [],  # Would need separate photos call
-        'tags': extract_tags_v2(venue),
-        'checkins': stats.get('checkinsCount'),
-        'users': stats.get('usersCount'),
-    }
-    
-    return venue_data
-
-
-def extract_tags_v2(venue: Dict[str, Any]) -> List[str]:
-    """Extract relevant tags from v2 venue data"""
-    tags = []
-    
-    # Add price level as tag
-    price = venue.get('price', {}).get('tier')
-    if price:
-        tags.append(f'price_level_{price}')
-    
-    # Add rating as tag if available
-    rating = venue.get('rating')
-    if rating and rating >= 8.0:
-        tags.append('highly_rated')
-    
-    # Add verified tag if venue is verified
-    if venue.get('verified'):
-        tags.append('verified')
-    
-    return tags
-
-
-def parse_foursquare_venue(result: Dict[str, Any]) -> Dict[str, Any]:
-    """Parse a Foursquare venue result into our format"""
-    
-    # Extract location data
-    geocodes = result.get('geocodes', {}).get('main', {})
-    lat = geocodes.get('latitude')
-    lon = geocodes.get('longitude')
-    
-    # Calculate distance from campus
-    distance = None
-    if lat and lon:
-        distance = haversine(CAMPUS_LON, CAMPUS_LAT, lon, lat)
-        distance = round(distance, 2)
-    
-    # Get primary category
-    categories = result.get('categories', [])
-    primary_category = categories[0] if categories else {}
-    category_id = primary_category.get('id')
-    category_name = CATEGORY_NAMES.get(category_id, 'other')
-    
-    # Get all category names
-    category_list = [cat.get('name', '') for cat in categories]
-    
-    # Extract location details
-    location = result.get('location', {})
-    address_parts = []
-    if location.get('address'):
-        address_parts.append(location['address'])
-    if location.get('locality'):
-        address_parts.append(location['locality'])
-    if location.get('region'):
-        address_parts.append(location['region'])
-    
-    formatted_address = ', '.join(address_parts) if address_parts else None
-    
-    # Extract opening hours
-    hours = result.get('hours', {})
-    opening_hours = None
-    if hours:
-        opening_hours = {
-            'display': hours.get('display'),
-            'is_open_now': hours.get('open_now'),
-            'regular': hours.get('regular', [])
-        }
-    
-    # Extract photos
-    photos = result.get('photos', [])
-    photo_urls = []
-    for photo in photos[:3]:  # Get up to 3 photos
-        prefix = photo.get('prefix', '')
-        suffix = photo.get('suffix', '')
-        if prefix and suffix:
-            # Build photo URL with medium size
-            photo_url = f"{prefix}300x300{suffix}"
-            photo_urls.append(photo_url)
-    
-    venue_data = {
-        'name': result.get('name', 'Unnamed'),
-        'category': category_name,
-        'categories': category_list,
-        'fsq_id': result.get('fsq_id'),
-        'latitude': lat,
-        'longitude': lon,
-        'distance_from_campus': distance,
-        'address': formatted_address,
-        'locality': location.get('locality'),
-        'region': location.get('region'),
-        'postcode': location.get('postcode'),
-        'country': location.get('country', 'TR'),
-        'phone': result.get('tel'),
-        'website': result.get('website'),
-        'email': result.get('email'),
-        'description': result.get('description'),
-        'rating': result.get('rating'),
-        'price': result.get('price'),
-        'opening_hours': opening_hours,
-        'photos': photo_urls,
-        'tags': extract_tags(result),
-    }
-    
-    return venue_data
-
-
-def extract_tags(venue: Dict[str, Any]) -> List[str]:
-    """Extract relevant tags from venue data"""
-    tags = []
-    
-    # Check if venue is open now
-    hours = venue.get('hours', {})
-    if hours.get('open_now'):
-        tags.append('open_now')
-    
-    # Add price level as tag
-    price = venue.get('price')
-    if price:
-        tags.append(f'price_level_{price}')
-    
-    # Add rating as tag if available
-    rating = venue.get('rating')
-    if rating and rating >= 8.0:
-        tags.append('highly_rated')
+    features = venue.get('features') or _EMPTY
+    tags.extend(
+        label for group, key, label in _FEATURE_TAGS
+        if (features.get(group) or _EMPTY).get(key)
+    )
     
     return tags
 
 
-def fetch_restaurants_from_foursquare(limit: int = 50) -> List[Dict[str, Any]]:
+def fetch_restaurants_from_foursquare(limit: int = 50) -> List[VenueRecord]:
     """
     Convenience function to fetch dining venues
     
@@ -495,7 +350,7 @@ def fetch_restaurants_from_foursquare(limit: int = 50) -> List[Dict[str, Any]]:
     return fetch_venues_from_foursquare(venue_type="dining", limit=limit)
 
 
-def fetch_entertainment_from_foursquare(limit: int = 50) -> List[Dict[str, Any]]:
+def fetch_entertainment_from_foursquare(limit: int = 50) -> List[VenueRecord]:
     """
     Convenience function to fetch entertainment venues
     
@@ -4,33 +4,345 @@ Supports Turkish and English responses based on user query language
 Uses E5 embeddings for semantic search of documents, courses, restaurants, and events
 """
 
+import heapq
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import List, Dict, Optional
+import httpx
 from groq import Groq
-from langdetect import detect, LangDetectException
-import psycopg2
+from langdetect import detect, DetectorFactory, LangDetectException
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from sentence_transformers import SentenceTransformer
+import torch
 import chromadb
 import numpy as np
 
+from app.core.vector_store import EMBEDDING_MODEL_NAME, VENUES_COLLECTION
+
+# Seconds a cached project context is trusted before re-checking the documents table
+PROJECT_CONTEXT_TTL = 300
+# Project documents sent per chat turn, chosen by similarity to the user's message
+# (all documents are sent when there are no more than this)
+PROJECT_CONTEXT_TOP_K = 3
+
+# "torch" (default) or "onnx"/"openvino"; the latter need sentence-transformers[onnx]
+# and an exported model file, e.g. the INT8-quantized onnx/model_qint8_avx512_vnni.onnx
+EMBEDDING_BACKEND = os.getenv("SAGE_EMBEDDING_BACKEND", "torch")
+EMBEDDING_MODEL_FILE = os.getenv("SAGE_EMBEDDING_MODEL_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+# Intra-op threads for query encoding; 0 = one per CPU available to this process.
+# Lower it when running several uvicorn workers on one host to avoid oversubscription
+EMBEDDING_NUM_THREADS = int(os.getenv("SAGE_EMBEDDING_NUM_THREADS", "0"))
+
+# Number of distinct query embeddings memoized per service instance
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+
+# Retrieved venue/event context reused for repeated social queries (refinement turns,
+# retries); venue and event data only change when the embedding scripts are re-run
+SOCIAL_CONTEXT_TTL = 300
+SOCIAL_CONTEXT_CACHE_SIZE = 512
+
+# Semantic response cache for the academic and social chats: a stored answer is reused when
+# a new question embeds within this cosine similarity under the same cache key
+RESPONSE_CACHE_SIMILARITY = 0.93
+RESPONSE_CACHE_TTL = 3600
+RESPONSE_CACHE_SIZE = 256  # answers kept per cache key
+
+# Approximate token budget for conversation history sent to Groq (~4 chars per token)
+HISTORY_TOKEN_BUDGET = 1500
+
+# Rolling history summary: the last HISTORY_VERBATIM_MESSAGES messages are always sent
+# verbatim; older ones are replaced by a summary refreshed in the background once
+# HISTORY_SUMMARY_REFRESH unsummarized older messages accumulate
+HISTORY_VERBATIM_MESSAGES = 4
+HISTORY_SUMMARY_REFRESH = 4
+HISTORY_SUMMARY_CACHE_SIZE = 512
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+
+# Groq HTTP transport: one keep-alive connection pool per service instance. The SDK retries
+# 429/5xx/connection errors itself with exponential backoff, honouring Retry-After
+GROQ_MAX_CONNECTIONS = 64
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 32
+GROQ_KEEPALIVE_EXPIRY = 60.0
+GROQ_TIMEOUT = 60.0
+GROQ_CONNECT_TIMEOUT = 5.0
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+
+# Social reply length budget: a base allowance plus room per retrieved venue/event,
+# capped by SAGE_MAX_OUTPUT_TOKENS, so short listings don't reserve 2000 output tokens
+MAX_OUTPUT_TOKENS = int(os.getenv("SAGE_MAX_OUTPUT_TOKENS", "2000"))
+SOCIAL_OUTPUT_BASE_TOKENS = 256
+SOCIAL_OUTPUT_TOKENS_PER_ITEM = 96
+
+# Upper bound on pooled PostgreSQL connections per service instance
+PG_POOL_MAX_CONN = 10
+
+# Text searched by the keyword fallback; must match idx_courses_search_trgm in init.sql
+COURSE_SEARCH_EXPR = (
+    "(coalesce(course_title, '') || ' ' || coalesce(catalog_description, '') || ' ' || course_code)"
+)
+
+# Course codes mentioned in assistant replies, e.g. "CMPE 113"
+COURSE_CODE_RE = re.compile(r'\b[A-Z]{2,4}\s*\d{3}\b')
+
+# Per-type venue collections, only searched until VENUES_COLLECTION has been built
+LEGACY_VENUE_COLLECTIONS = ("dining_places", "entertainment_places")
+
+# Venue/event categories a social question asks about, matched in one regex pass. Turkish
+# words are open-ended stems so suffixes still match (kafeler, restoranlar); English words
+# list their inflections and end on \b so "pub" never tags "public" nor "event" "eventually".
+# Order matters: "cafeteria" must win over "cafe". Any match marks the question as a
+# venue/event lookup; when retrieval comes back empty for one, the fixed reply below is
+# returned instead of asking Groq to produce it
+VENUE_CATEGORY_STEMS = (
+    ('cafeteria', r'kantin|yemekhane|cafeterias?\b|canteens?\b'),
+    ('dessert_shop', r'tatl[ıi]|dondurma|pastane|desserts?\b|ice creams?\b'),
+    ('cafe', r'kafe|caf[eé]s?\b|kahve|coffees?\b'),
+    ('restaurant', r'restoran|restaurants?\b|lokanta'),
+    ('dining_drinking', r'bars?\b|barlar|pubs?\b|meyhane'),
+    ('arcade', r'oyun|arcades?\b'),
+    ('art_gallery', r'sanat|galeri|galler(?:y|ies)\b|müze|museums?\b'),
+    ('event', r'etkinlik|events?\b|konser(?!vatuvar)|concerts?\b|tiyatro|theat(?:er|re)s?\b'),
+    ('venue', r'mekan(?!ik)|yemek|foods?\b'),
+)
+VENUE_CATEGORY_RE = re.compile(
+    r'\b(?:' + '|'.join(f'(?P<{name}>{stems})' for name, stems in VENUE_CATEGORY_STEMS) + ')',
+    re.IGNORECASE
+)
+SOCIAL_LANGUAGE_LOCK = {
+    'tr': "YANIT DİLİ: Kullanıcı Türkçe yazdı. YALNIZCA Türkçe yanıt ver; başka bir dilde yanıt "
+          "geçersizdir. Mekan adları, etkinlik adları ve URL'ler olduğu gibi kalmalı.",
+    'en': "RESPONSE LANGUAGE: The user wrote in English. Respond ONLY in English; any other "
+          "language is invalid. Keep venue names, event names and URLs exactly as given."
+}
+NO_SOCIAL_CONTEXT_RESPONSES = {
+    'tr': "Veritabanımda kampüs yakınında bu kategoriye ait mekan veya etkinlik bulunmuyor. "
+          "Verilerim sınırlı olabilir.",
+    'en': "I don't have any venues or events in this category in my database near campus. "
+          "My data might be limited."
+}
+
+# chat_stream flushes buffered tokens on a newline, at this many characters, or after this many seconds
+STREAM_FLUSH_CHARS = 128
+STREAM_FLUSH_INTERVAL = 0.05
+
+# langdetect is randomized; seed it so memoized and fresh detections agree
+DetectorFactory.seed = 0
+
+# Cheap Turkish signals checked before falling back to langdetect: Turkish-only letters
+# (case-sensitive on purpose - IGNORECASE would fold ı/İ onto ASCII i) or common stopwords
+TURKISH_SIGNAL_RE = re.compile(r'[çğıöşüÇĞİÖŞÜ]|\b(?i:ve|bir|nedir|hangi)\b')
+LANGUAGE_SNIFF_LENGTH = 256
+
+# Threads used to run independent ChromaDB/Postgres calls concurrently
+IO_POOL_WORKERS = 4
+
+# (metadata key, label) pairs rendered as "Label: value" lines when present
+VENUE_HEAD_FIELDS = (("category", "Category: "), ("cuisine_type", "Cuisine: "))
+VENUE_TAIL_FIELDS = (
+    ("price", "Price: "),
+    ("address", "Address: "),
+    ("tags", "Features: "),
+    ("phone", "Phone: "),
+)
+EVENT_FIELDS = (
+    ("category", "Category: "),
+    ("event_type", "Type: "),
+    ("event_date", "Date: "),
+    ("venue_name", "Venue: "),
+    ("price_info", "Price: "),
+    ("ticket_url", "Ticket URL: "),
+)
+
+
+def _append_fields(append, metadata: Dict, fields) -> None:
+    """Append a "Label: value" line for each non-empty metadata field"""
+    for key, label in fields:
+        value = metadata.get(key)
+        if value:
+            append(label + str(value))
+
+
+@lru_cache(maxsize=4096)
+def _detect_language_sample(sample: str) -> str:
+    """langdetect on a text sample, memoized for repeated prompts"""
+    try:
+        lang = detect(sample)
+        return 'tr' if lang == 'tr' else 'en'
+    except LangDetectException:
+        return 'en'  # Default to English
+
+
+def _relevance_percentages(distances: List[float]) -> np.ndarray:
+    """Relevance shown to the model: cosine similarity in percent (1 - cosine distance), for all hits at once"""
+    return (1.0 - np.asarray(distances, dtype=np.float64)) * 100
+
+
+def _coalesce_stream(stream):
+    """
+    Yield the text of a Groq completion stream, coalescing tokens so the SSE
+    endpoint sends one frame per line / ~128 chars / 50 ms instead of one per token
+    """
+    buffer = []
+    buffered = 0
+    last_flush = time.monotonic()
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        
+        buffer.append(delta)
+        buffered += len(delta)
+        now = time.monotonic()
+        if ("\n" in delta or buffered >= STREAM_FLUSH_CHARS
+                or now - last_flush >= STREAM_FLUSH_INTERVAL):
+            yield "".join(buffer)
+            buffer.clear()
+            buffered = 0
+            last_flush = now
+    
+    if buffer:
+        yield "".join(buffer)
+
+
+def _quantize_embedding(embedding: np.ndarray) -> tuple:
+    """Symmetric int8 quantization with a per-vector scale: embedding ~= codes * scale"""
+    scale = float(np.max(np.abs(embedding))) / 127 or 1.0
+    codes = np.round(embedding / scale).astype(np.int8)
+    return codes, scale
+
+
+def _venue_categories(text: str) -> tuple:
+    """Sorted category tags (see VENUE_CATEGORY_STEMS) mentioned in text"""
+    return tuple(sorted({match.lastgroup for match in VENUE_CATEGORY_RE.finditer(text)}))
+
+
+def _social_max_tokens(messages: List[Dict[str, str]]) -> int:
+    """Output token budget for a social reply, from the venues/events in the user turn"""
+    items = messages[-1]['content'].count("[Relevance: ")
+    return min(MAX_OUTPUT_TOKENS, SOCIAL_OUTPUT_BASE_TOKENS + SOCIAL_OUTPUT_TOKENS_PER_ITEM * items)
+
+
+def _format_campus_distance(dist_km: float) -> str:
+    """Meters below 1 km, otherwise kilometers with one decimal"""
+    if dist_km < 1.0:
+        return "Distance: " + str(int(dist_km * 1000)) + " meters from campus"
+    return f"Distance: {dist_km:.1f} km from campus"
+
+
+def _trim_history(history: List[Dict[str, str]], max_tokens: int = HISTORY_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """
+    Most recent messages that fit in max_tokens (len // 4 heuristic), oldest dropped first
+    The newest message is always kept so follow-up questions keep their referent
+    """
+    kept = []
+    used = 0
+    for msg in reversed(history):
+        used += len(msg['content']) // 4
+        if kept and used > max_tokens:
+            break
+        kept.append(msg)
+    kept.reverse()
+    return kept
+
+
+def _history_prefix_keys(history: List[Dict[str, str]]) -> List[int]:
+    """Rolling hash of every history prefix: keys[n - 1] identifies history[:n]"""
+    keys = []
+    key = None
+    for msg in history:
+        key = hash((key, msg['role'], msg['content']))
+        keys.append(key)
+    return keys
+
+
+def _embedding_num_threads() -> int:
+    """Configured thread count, defaulting to the CPUs this process may run on (cgroup/affinity aware)"""
+    if EMBEDDING_NUM_THREADS > 0:
+        return EMBEDDING_NUM_THREADS
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 4
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model() -> SentenceTransformer:
+    """
+    Query embedding model on the configured inference backend, loaded once per process
+    A warm-up encode moves tokenizer/graph initialisation off the first user query
+    """
+    num_threads = _embedding_num_threads()
+    
+    if EMBEDDING_BACKEND == "torch":
+        torch.set_num_threads(num_threads)
+        # A single query encode has no independent ops to run side by side; one inter-op
+        # thread avoids a second pool competing with the intra-op threads
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Already fixed once inter-op work has started in this process
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    else:
+        model_kwargs = {"file_name": EMBEDDING_MODEL_FILE}
+        if EMBEDDING_BACKEND == "onnx":
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = num_threads
+            model_kwargs["session_options"] = session_options
+        
+        model = SentenceTransformer(
+            EMBEDDING_MODEL_NAME,
+            backend=EMBEDDING_BACKEND,
+            model_kwargs=model_kwargs
+        )
+    
+    model.encode(["query: warmup"])
+    return model
+
+
+@lru_cache(maxsize=1)
+def get_chroma_client():
+    """ChromaDB HTTP client shared by all service instances"""
+    return chromadb.HttpClient(
+        host=os.getenv("CHROMA_HOST", "chromadb"),
+        port=int(os.getenv("CHROMA_PORT", "8000"))
+    )
+
+
 class GroqAcademicService:
     def __init__(self):
         self.api_key = os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
         
-        self.client = Groq(api_key=self.api_key)
+        self.client = Groq(
+            api_key=self.api_key,
+            max_retries=GROQ_MAX_RETRIES,
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=GROQ_MAX_CONNECTIONS,
+                    max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=GROQ_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT)
+            )
+        )
         self.model = "llama-3.3-70b-versatile"  # Fast and powerful model
         
-        # Initialize embedding model (same as courses)
-        self.embedding_model = SentenceTransformer("intfloat/e5-large-v2")
+        # Embedding model (same as courses) and ChromaDB client are shared per process
+        self.embedding_model = get_embedding_model()
+        self._query_embedding_cache = OrderedDict()  # normalized query -> embedding (LRU order)
+        self._query_embedding_lock = threading.Lock()
         
-        # ChromaDB client for course embeddings
-        self.chroma_client = chromadb.HttpClient(
-            host=os.getenv("CHROMA_HOST", "chromadb"),
-            port=int(os.getenv("CHROMA_PORT", "8000"))
-        )
+        # ChromaDB client for course embeddings, and collection handles resolved on first use
+        self.chroma_client = get_chroma_client()
+        self._collections = {}
         
         # Database connection info
         self.db_config = {
@@ -40,48 +352,422 @@ class GroqAcademicService:
             'user': os.getenv("POSTGRES_USER", "sage_user"),
             'password': os.getenv("POSTGRES_PASSWORD", "sage_password")
         }
+        
+        # Connection pool, opened lazily so the service starts even if Postgres is down
+        self._pg_pool = None
+        self._pg_pool_lock = threading.Lock()
+        
+        # Whether pg_trgm is installed for the keyword fallback; None until checked
+        self._course_trigram_search = None
+        
+        # Project context cache: (checked_at, documents_version, context, docs)
+        self._project_context_cache = None
+        self._project_context_lock = threading.Lock()
+        # E5 passage embeddings of the cached docs: (documents_version, unit vectors)
+        self._project_doc_embeddings = None
+        
+        # Social context cache: normalized query -> (stored_at, restaurant_context, event_context)
+        self._social_context_cache = OrderedDict()
+        self._social_context_lock = threading.Lock()
+        
+        # Response cache: key from _response_cache_key / chat_social ->
+        # [(stored_at, int8 codes, scale, answer)], see _quantize_embedding
+        self._response_cache = {}
+        self._response_cache_lock = threading.Lock()
+        
+        # Worker threads for overlapping blocking I/O (ChromaDB round-trips)
+        self._io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS)
+        
+        # Rolling history summaries: history prefix key -> summary (LRU order).
+        # Summaries are generated off the request path on their own worker
+        self._history_summaries = OrderedDict()
+        self._history_summary_pending = set()
+        self._history_summary_lock = threading.Lock()
+        self._summary_pool = ThreadPoolExecutor(max_workers=1)
+        
+        # Static system messages per (assistant, language), built once and shared by every request
+        self._system_messages = {}
     
-    def detect_language(self, text: str) -> str:
-        """Detect if text is Turkish or English"""
+    def _history_messages(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        History to send to Groq: the latest summary of older turns (once one is ready)
+        followed by the messages it does not cover, within HISTORY_TOKEN_BUDGET
+        """
+        older = len(history) - HISTORY_VERBATIM_MESSAGES
+        if older <= 0:
+            return _trim_history(history)
+        
+        prefix_keys = _history_prefix_keys(history[:older])
+        covered = 0
+        summary = None
+        with self._history_summary_lock:
+            for n in range(older, 0, -1):
+                summary = self._history_summaries.get(prefix_keys[n - 1])
+                if summary is not None:
+                    self._history_summaries.move_to_end(prefix_keys[n - 1])
+                    covered = n
+                    break
+        
+        if older - covered >= HISTORY_SUMMARY_REFRESH:
+            self._schedule_history_summary(prefix_keys[older - 1], summary, history[covered:older])
+        
+        if summary is None:
+            return _trim_history(history)
+        
+        return [
+            {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"},
+            *_trim_history(history[covered:])
+        ]
+    
+    def _schedule_history_summary(self,
+                                  key: int,
+                                  previous_summary: Optional[str],
+                                  messages: List[Dict[str, str]]):
+        """Fold messages into previous_summary in the background, once per history prefix"""
+        with self._history_summary_lock:
+            if key in self._history_summary_pending:
+                return
+            self._history_summary_pending.add(key)
+        
+        self._summary_pool.submit(self._summarize_history, key, previous_summary, messages)
+    
+    def _summarize_history(self,
+                           key: int,
+                           previous_summary: Optional[str],
+                           messages: List[Dict[str, str]]):
+        """Generate a rolling summary with the small model and store it under key"""
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        if previous_summary:
+            transcript = f"Summary so far:\n{previous_summary}\n\nNew messages:\n{transcript}"
+        
         try:
-            lang = detect(text)
-            return 'tr' if lang == 'tr' else 'en'
-        except LangDetectException:
-            return 'en'  # Default to English
+            response = self.client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": (
+                        "Summarize this conversation between a student and an assistant in at most "
+                        "120 words, in the conversation's language. Keep course codes, venue and "
+                        "event names, and any facts or preferences the student stated."
+                    )},
+                    {"role": "user", "content": transcript}
+                ],
+                temperature=0.2,
+                max_tokens=300,
+                stream=False
+            )
+            summary = response.choices[0].message.content
+            
+            with self._history_summary_lock:
+                self._history_summaries[key] = summary
+                while len(self._history_summaries) > HISTORY_SUMMARY_CACHE_SIZE:
+                    self._history_summaries.popitem(last=False)
+        
+        except Exception as e:
+            print(f"Error summarizing conversation history: {str(e)}")
+        
+        finally:
+            with self._history_summary_lock:
+                self._history_summary_pending.discard(key)
     
-    def get_project_context(self) -> str:
-        """Get project information from documents table using semantic search"""
+    def _system_message(self, assistant: str, language: str) -> Dict[str, str]:
+        """Memoized system message for the 'academic' or 'social' assistant"""
+        key = (assistant, language)
+        message = self._system_messages.get(key)
+        if message is None:
+            prompt = (self.create_system_prompt(language) if assistant == 'academic'
+                      else self.create_social_system_prompt(language))
+            message = self._system_messages.setdefault(key, {"role": "system", "content": prompt})
+        return message
+    
+    def _get_pg_pool(self) -> ThreadedConnectionPool:
+        """Return the PostgreSQL connection pool, creating it on first use"""
+        if self._pg_pool is None:
+            with self._pg_pool_lock:
+                if self._pg_pool is None:
+                    self._pg_pool = ThreadedConnectionPool(
+                        minconn=1,
+                        maxconn=PG_POOL_MAX_CONN,
+                        **self.db_config
+                    )
+        return self._pg_pool
+    
+    @contextmanager
+    def _db_connection(self):
+        """Borrow a pooled autocommit connection (no multi-statement transactions here)"""
+        pool = self._get_pg_pool()
+        conn = pool.getconn()
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute("""
-                SELECT title, content, document_type 
-                FROM documents 
-                WHERE content IS NOT NULL
-                ORDER BY created_at DESC
-            """)
-            
-            docs = cursor.fetchall()
-            conn.close()
-            
-            if not docs:
-                return "No project documentation available."
-            
-            # Build context from available documents
-            context_parts = ["PROJECT DOCUMENTATION:\n"]
-            for doc in docs:
-                context_parts.append(f"\n=== {doc['document_type'].upper()}: {doc['title']} ===")
-                if doc['content']:
-                    # Limit content length to avoid token limits
-                    content = doc['content'][:2000]
-                    context_parts.append(f"{content}\n")
+            conn.autocommit = True
+            yield conn
+        finally:
+            # Discard connections the server has dropped instead of reusing them
+            pool.putconn(conn, close=bool(conn.closed))
+    
+    def _encode_query(self, query: str) -> List[float]:
+        """E5 query embedding, memoized on whitespace-normalized query text"""
+        return self._encode_queries([query])[0]
+    
+    def _encode_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        E5 query embeddings for several queries, memoized on whitespace-normalized text
+        All cache misses are encoded together in a single batched forward pass
+        """
+        cache = self._query_embedding_cache
+        keys = [" ".join(query.split()) for query in queries]
+        
+        # Requests run on several threads; the lock covers cache bookkeeping, not encoding
+        with self._query_embedding_lock:
+            found = {key: cache[key] for key in keys if key in cache}
+        
+        misses = list(dict.fromkeys(key for key in keys if key not in found))
+        if misses:
+            # E5 expects the "query: " prefix for retrieval queries
+            embeddings = self.embedding_model.encode(
+                [f"query: {key}" for key in misses],
+                batch_size=len(misses),
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            # chromadb 0.4.x only accepts embeddings as lists of Python floats, so
+            # convert the whole float32 batch once here; cache hits reuse the lists
+            found.update(zip(misses, embeddings.tolist()))
+        
+        with self._query_embedding_lock:
+            for key in keys:
+                if key in cache:
+                    cache.move_to_end(key)
+                else:
+                    cache[key] = found[key]
             
-            return "\n".join(context_parts)
+            while len(cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                cache.popitem(last=False)
+        
+        return [found[key] for key in keys]
+    
+    def _response_cache_key(self,
+                            language: str,
+                            user_message: str,
+                            conversation_history: Optional[List[Dict[str, str]]],
+                            include_courses: bool) -> tuple:
+        """
+        Cache key for a chat answer. Course codes are part of the key because
+        "who teaches CMPE 113?" and "who teaches CMPE 114?" embed almost identically;
+        without codes in the message, the last one in the recent history is used so
+        follow-ups like "who teaches it?" never match across courses. The previous
+        turn is hashed in as well, so code-less follow-ups ("tell me more") from
+        unrelated conversations never share an answer
+        """
+        course_codes = COURSE_CODE_RE.findall(user_message)
+        if not course_codes:
+            for msg in reversed((conversation_history or [])[-3:]):
+                course_codes = COURSE_CODE_RE.findall(msg['content'])[-1:]
+                if course_codes:
+                    break
+        last_turn = conversation_history[-1]['content'] if conversation_history else None
+        return ("academic", language, include_courses,
+                tuple(code.replace(" ", "") for code in course_codes), hash(last_turn))
+    
+    def _message_embedding(self, text: str) -> np.ndarray:
+        """Unit-length E5 query embedding of a user message, for response cache lookups"""
+        embedding = np.asarray(self._encode_query(text), dtype=np.float32)
+        embedding /= np.linalg.norm(embedding) or 1.0
+        return embedding
+    
+    def _get_cached_response(self, key: tuple, embedding: np.ndarray) -> Optional[str]:
+        """Return a fresh cached answer to a semantically equivalent question, if any"""
+        with self._response_cache_lock:
+            entries = self._response_cache.get(key)
+            if not entries:
+                return None
+            
+            cutoff = time.monotonic() - RESPONSE_CACHE_TTL
+            entries[:] = [entry for entry in entries if entry[0] >= cutoff]
+            if not entries:
+                return None
+            
+            # Integer dot products on the int8 codes, rescaled to cosine similarity
+            codes, scale = _quantize_embedding(embedding)
+            dots = np.stack([entry[1] for entry in entries]).astype(np.int32) @ codes.astype(np.int32)
+            similarities = dots * np.array([entry[2] for entry in entries]) * scale
+            best = int(np.argmax(similarities))
+            if similarities[best] >= RESPONSE_CACHE_SIMILARITY:
+                return entries[best][3]
+            return None
+    
+    def _cache_response(self, key: tuple, embedding: np.ndarray, response: str) -> None:
+        """Store an answer with its int8-quantized embedding, dropping the oldest beyond RESPONSE_CACHE_SIZE"""
+        codes, scale = _quantize_embedding(embedding)
+        with self._response_cache_lock:
+            entries = self._response_cache.setdefault(key, [])
+            entries.append((time.monotonic(), codes, scale, response))
+            del entries[:-RESPONSE_CACHE_SIZE]
+    
+    def detect_language(self, text: str) -> str:
+        """
+        Detect if text is Turkish or English
+        Turkish-only letters or common Turkish stopwords decide without running langdetect
+        """
+        sample = text[:LANGUAGE_SNIFF_LENGTH]
+        if TURKISH_SIGNAL_RE.search(sample):
+            return 'tr'
+        return _detect_language_sample(sample)
+    
+    def _resolve_language(self, text: str, language: Optional[str]) -> str:
+        """Use the client-supplied language when it is a supported one, else detect it"""
+        if language in ('tr', 'en'):
+            return language
+        return self.detect_language(text)
+    
+    def get_project_context(self) -> str:
+        """
+        Get project information from documents table
+        Cached for PROJECT_CONTEXT_TTL seconds; after that a cheap version probe
+        (row count + latest change) decides whether the context must be rebuilt
+        """
+        cached = self._project_context_cache
+        if cached and time.monotonic() - cached[0] < PROJECT_CONTEXT_TTL:
+            return cached[2]
+        
+        with self._project_context_lock:
+            cached = self._project_context_cache
+            if cached and time.monotonic() - cached[0] < PROJECT_CONTEXT_TTL:
+                return cached[2]
+            
+            try:
+                with self._db_connection() as conn:
+                    cursor = conn.cursor(cursor_factory=RealDictCursor)
+                    
+                    cursor.execute("""
+                        SELECT COUNT(*) AS doc_count,
+                               MAX(COALESCE(updated_at, created_at)) AS last_changed
+                        FROM documents
+                        WHERE content IS NOT NULL
+                    """)
+                    row = cursor.fetchone()
+                    version = (row['doc_count'], row['last_changed'])
+                    
+                    if cached and cached[1] == version:
+                        self._project_context_cache = (time.monotonic(), version) + cached[2:]
+                        return cached[2]
+                    
+                    cursor.execute("""
+                        SELECT title, content, document_type 
+                        FROM documents 
+                        WHERE content IS NOT NULL
+                        ORDER BY created_at DESC
+                    """)
+                    
+                    docs = cursor.fetchall()
+                
+                context = self._build_project_context(docs)
+                self._project_context_cache = (time.monotonic(), version, context, docs)
+                return context
+            
+            except Exception as e:
+                print(f"Error fetching project context: {e}")
+                return "Project: SAGE - Student Academic Guidance and Engagement system for Kolej Campus"
+    
+    def get_relevant_project_context(self, query: str, top_k: int = PROJECT_CONTEXT_TOP_K) -> str:
+        """
+        Project documentation limited to the top_k documents most similar to query
+        Document embeddings are computed once per documents version
+        """
+        context = self.get_project_context()
+        cached = self._project_context_cache
+        if not cached or len(cached[3]) <= top_k:
+            return context
+        
+        version, docs = cached[1], cached[3]
+        with self._project_context_lock:
+            doc_embeddings = self._project_doc_embeddings
+            if doc_embeddings is None or doc_embeddings[0] != version:
+                # E5 expects the "passage: " prefix for indexed text
+                matrix = self.embedding_model.encode(
+                    [f"passage: {doc['title']}\n{doc['content'][:2000]}" for doc in docs],
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                )
+                doc_embeddings = self._project_doc_embeddings = (version, np.asarray(matrix, dtype=np.float32))
+        
+        similarities = doc_embeddings[1] @ self._message_embedding(query)
+        best = np.argsort(-similarities)[:top_k]
+        # Keep the documents in their usual (newest first) order
+        return self._build_project_context([docs[i] for i in sorted(best)])
+    
+    def _build_project_context(self, docs: List[Dict]) -> str:
+        """Build the project documentation block for the system prompt"""
+        if not docs:
+            return "No project documentation available."
         
+        # Build context from available documents
+        context_parts = ["PROJECT DOCUMENTATION:\n"]
+        for doc in docs:
+            context_parts.append(f"\n=== {doc['document_type'].upper()}: {doc['title']} ===")
+            if doc['content']:
+                # Limit content length to avoid token limits
+                content = doc['content'][:2000]
+                context_parts.append(f"{content}\n")
+        
+        return "\n".join(context_parts)
+    
+    def warm_up(self):
+        """
+        Resolve the ChromaDB collection handles and load the project context ahead of
+        the first request. Failures are only logged; the request path retries them
+        """
+        for name in ("tedu_courses", VENUES_COLLECTION, "events"):
+            try:
+                self._collections[name] = self.chroma_client.get_collection(name)
+            except Exception as e:
+                print(f"Warm-up: collection {name} unavailable: {e}")
+        
+        self._ensure_course_search_index()
+        self.get_project_context()
+    
+    def _ensure_course_search_index(self) -> bool:
+        """
+        Install pg_trgm and idx_courses_search_trgm if missing (both idempotent), so
+        databases created before the index existed need no embedding-script rerun.
+        Returns whether pg_trgm is available; without it the fallback orders plainly
+        """
+        try:
+            with self._db_connection() as conn:
+                cursor = conn.cursor()
+                for statement in (
+                    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                    f"CREATE INDEX IF NOT EXISTS idx_courses_search_trgm "
+                    f"ON courses USING GIN ({COURSE_SEARCH_EXPR} gin_trgm_ops)",
+                ):
+                    try:
+                        cursor.execute(statement)
+                    except Exception as e:
+                        # e.g. no CREATE privilege or no courses table yet
+                        print(f"Course search index setup skipped: {e}")
+                
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                self._course_trigram_search = cursor.fetchone() is not None
         except Exception as e:
-            print(f"Error fetching project context: {e}")
-            return "Project: SAGE - Student Academic Guidance and Engagement system for Kolej Campus"
+            print(f"Error checking course search index: {e}")
+            return False
+        
+        return self._course_trigram_search
+    
+    def _query_collection(self, name: str, **query_kwargs) -> Dict:
+        """
+        Query a ChromaDB collection through a cached handle, saving the collection
+        lookup round-trip. A handle that fails (e.g. the collection was recreated by
+        an embedding script) is dropped and resolved again once
+        """
+        collection = self._collections.get(name)
+        if collection is not None:
+            try:
+                return collection.query(**query_kwargs)
+            except Exception:
+                self._collections.pop(name, None)
+        
+        collection = self.chroma_client.get_collection(name)
+        self._collections[name] = collection
+        return collection.query(**query_kwargs)
     
     def get_course_context_with_embeddings(self, query: str, top_k: int = 3) -> str:
         """
@@ -89,17 +775,15 @@ class GroqAcademicService:
         Uses ChromaDB for vector similarity search
         """
         try:
-            # Get the course collection from ChromaDB
-            collection = self.chroma_client.get_collection("tedu_courses")
-            
-            # Create query embedding using E5 model (add "query: " prefix for better retrieval)
-            query_text = f"query: {query}"
-            query_embedding = self.embedding_model.encode([query_text])[0].tolist()
+            # Create query embedding using E5 model
+            query_embedding = self._encode_query(query)
             
-            # Search in ChromaDB using vector similarity
-            results = collection.query(
+            # Search the course collection in ChromaDB using vector similarity
+            results = self._query_collection(
+                "tedu_courses",
                 query_embeddings=[query_embedding],
-                n_results=top_k
+                n_results=top_k,
+                include=["metadatas", "documents", "distances"]
             )
             
             if not results['ids'] or len(results['ids'][0]) == 0:
@@ -108,16 +792,12 @@ class GroqAcademicService:
             # Build course context from search results
             context_parts = ["RELEVANT COURSES (Semantic Search Results):\n"]
             
-            for idx in range(len(results['ids'][0])):
-                metadata = results['metadatas'][0][idx]
-                document = results['documents'][0][idx]
-                distance = results['distances'][0][idx] if 'distances' in results else None
-                
-                # Calculate similarity score (1 - distance for cosine)
-                similarity = 1.0 - distance if distance is not None else 0.0
-                
+            # Similarity score (1 - distance for cosine), converted for all hits at once
+            relevances = _relevance_percentages(results['distances'][0])
+            
+            for metadata, document, relevance in zip(results['metadatas'][0], results['documents'][0], relevances):
                 context_parts.append(
-                    f"\n[Relevance: {similarity*100:.1f}%] {metadata['course_code']} - {metadata['course_title']}"
+                    f"\n[Relevance: {relevance:.1f}%] {metadata['course_code']} - {metadata['course_title']}"
                 )
                 
                 if metadata.get('instructor'):
@@ -139,20 +819,34 @@ class GroqAcademicService:
     def _fallback_course_search(self, query: str, top_k: int = 3) -> str:
         """Fallback course search using PostgreSQL when ChromaDB is unavailable"""
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute("""
-                SELECT course_code, course_title, catalog_description, instructor
-                FROM courses
-                WHERE course_title ILIKE %s 
-                   OR catalog_description ILIKE %s
-                   OR course_code ILIKE %s
-                LIMIT %s
-            """, (f"%{query}%", f"%{query}%", f"%{query}%", top_k))
+            trigram_search = self._course_trigram_search
+            if trigram_search is None:
+                trigram_search = self._ensure_course_search_index()
             
-            courses = cursor.fetchall()
-            conn.close()
+            with self._db_connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                
+                # Single ILIKE over the indexed expression so idx_courses_search_trgm
+                # (pg_trgm GIN) is used instead of a sequential scan; ranked by
+                # word_similarity only when pg_trgm is installed
+                if trigram_search:
+                    cursor.execute(f"""
+                        SELECT course_code, course_title, catalog_description, instructor
+                        FROM courses
+                        WHERE {COURSE_SEARCH_EXPR} ILIKE %s
+                        ORDER BY word_similarity(%s, {COURSE_SEARCH_EXPR}) DESC
+                        LIMIT %s
+                    """, (f"%{query}%", query, top_k))
+                else:
+                    cursor.execute(f"""
+                        SELECT course_code, course_title, catalog_description, instructor
+                        FROM courses
+                        WHERE {COURSE_SEARCH_EXPR} ILIKE %s
+                        ORDER BY course_code
+                        LIMIT %s
+                    """, (f"%{query}%", top_k))
+                
+                courses = cursor.fetchall()
             
             if not courses:
                 return ""
@@ -174,15 +868,18 @@ class GroqAcademicService:
             print(f"Error in fallback course search: {e}")
             return ""
     
-    def create_system_prompt(self, language: str, project_context: str) -> str:
-        """Create system prompt based on detected language"""
+    def create_system_prompt(self, language: str) -> str:
+        """
+        Create system prompt based on detected language
+        The text is static per language so the message prefix stays byte-identical
+        across requests (provider-side prompt caching); project documentation is
+        sent separately by _build_chat_messages
+        """
         
         if language == 'tr':
-            return f"""Sen SAGE (Student Academic Guidance and Engagement) sisteminin akademik asistanısın. 
+            return """Sen SAGE (Student Academic Guidance and Engagement) sisteminin akademik asistanısın. 
 TED Üniversitesi öğrencilerine akademik konularda yardımcı oluyorsun.
 
-{project_context}
-
 GÖREVLER:
 1. Öğrencilere ders seçimi, akademik planlama ve öğrenim yolu konularında rehberlik et
 2. Proje dokümantasyonunu kullanarak sistemin özelliklerini açıkla
@@ -212,11 +909,9 @@ KURALLAR:
 - Öğrencilerin kariyer hedeflerine uygun ders önerileri sun"""
 
         else:  # English
-            return f"""You are the academic assistant for SAGE (Student Academic Guidance and Engagement) system.
+            return """You are the academic assistant for SAGE (Student Academic Guidance and Engagement) system.
 You help students at Kolej Campus with academic matters.
 
-{project_context}
-
 YOUR RESPONSIBILITIES:
 1. Guide students on course selection, academic planning, and learning paths
 2. Explain system features using the project documentation
@@ -245,29 +940,31 @@ SPECIAL NOTES:
 - Know courses from CMPE, SENG, ME, EE departments
 - Suggest courses aligned with students' career goals"""
     
-    def chat(self, 
-             user_message: str, 
-             conversation_history: List[Dict[str, str]] = None,
-             include_courses: bool = True) -> str:
+    def _build_chat_messages(self,
+                             language: str,
+                             project_context: str,
+                             conversation_history: Optional[List[Dict[str, str]]],
+                             enhanced_message: str) -> List[Dict[str, str]]:
         """
-        Generate response using Groq with RAG context
-        
-        Args:
-            user_message: User's query
-            conversation_history: Previous messages in format [{"role": "user/assistant", "content": "..."}]
-            include_courses: Whether to include course context in RAG
-        
-        Returns:
-            Assistant's response
+        Assemble academic chat messages, most stable content first:
+        static system prompt, project documentation, history, then the user turn
         """
+        messages = [
+            self._system_message('academic', language),
+            {"role": "system", "content": project_context},
+        ]
         
-        # Detect language
-        language = self.detect_language(user_message)
-        
-        # Get project context
-        project_context = self.get_project_context()
+        # Add conversation history
+        if conversation_history:
+            messages.extend(self._history_messages(conversation_history))
         
-        # Build enhanced search query using conversation history
+        messages.append({"role": "user", "content": enhanced_message})
+        return messages
+    
+    def _build_search_query(self,
+                            user_message: str,
+                            conversation_history: Optional[List[Dict[str, str]]]) -> str:
+        """Course search query: the message prefixed with recent user turns and course codes"""
         search_query = user_message
         if conversation_history and len(conversation_history) > 0:
             # Get last 2 user messages and last assistant message for context
@@ -277,8 +974,7 @@ SPECIAL NOTES:
                     recent_context.append(msg['content'])
                 elif msg['role'] == 'assistant':
                     # Extract course codes from assistant messages (e.g., "CMPE 113")
-                    import re
-                    course_codes = re.findall(r'\b[A-Z]{2,4}\s*\d{3}\b', msg['content'])
+                    course_codes = COURSE_CODE_RE.findall(msg['content'])
                     if course_codes:
                         recent_context.extend(course_codes[:2])  # Add up to 2 course codes
             
@@ -286,27 +982,82 @@ SPECIAL NOTES:
             if recent_context:
                 search_query = f"{' '.join(recent_context)} {user_message}"
         
+        return search_query
+    
+    def _prepare_academic_chat(self,
+                               user_message: str,
+                               conversation_history: Optional[List[Dict[str, str]]],
+                               include_courses: bool,
+                               language: Optional[str] = None):
+        """
+        Detect language, check the response cache, then retrieve project/course context
+        and assemble the academic chat messages (shared by chat and chat_stream)
+        
+        Returns:
+            (language, messages, response cache key, message embedding, cached response).
+            On a cache hit messages is None and no retrieval is done
+        """
+        
+        # Detect language
+        language = self._resolve_language(user_message, language)
+        
+        # Build enhanced search query using conversation history
+        search_query = self._build_search_query(user_message, conversation_history)
+        
+        # The cache lookup and the course search need different embeddings;
+        # encode both in one batched forward pass
+        if include_courses and search_query != user_message:
+            self._encode_queries([user_message, search_query])
+        
+        # Reuse the answer to an equivalent earlier question in the same context
+        cache_key = self._response_cache_key(language, user_message, conversation_history, include_courses)
+        message_embedding = self._message_embedding(user_message)
+        cached_response = self._get_cached_response(cache_key, message_embedding)
+        if cached_response is not None:
+            return language, None, cache_key, message_embedding, cached_response
+        
+        # Fetch project context (Postgres) in the background while the
+        # course retrieval runs on this thread
+        project_context_future = self._io_pool.submit(self.get_relevant_project_context, user_message)
+        
         # Get course context using semantic search with embeddings
         course_context = ""
         if include_courses:
             course_context = self.get_course_context_with_embeddings(search_query)
         
-        # Build system prompt
-        system_prompt = self.create_system_prompt(language, project_context)
-        
-        # Build messages for API
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history
-        if conversation_history:
-            messages.extend(conversation_history[-10:])  # Last 10 messages for context
-        
         # Add course context to user message if available
         enhanced_message = user_message
         if course_context:
             enhanced_message = f"{user_message}\n\n{course_context}"
         
-        messages.append({"role": "user", "content": enhanced_message})
+        # Build messages for API
+        project_context = project_context_future.result()
+        messages = self._build_chat_messages(language, project_context, conversation_history, enhanced_message)
+        return language, messages, cache_key, message_embedding, None
+    
+    def chat(self, 
+             user_message: str, 
+             conversation_history: List[Dict[str, str]] = None,
+             include_courses: bool = True,
+             language: Optional[str] = None) -> str:
+        """
+        Generate response using Groq with RAG context
+        
+        Args:
+            user_message: User's query
+            conversation_history: Previous messages in format [{"role": "user/assistant", "content": "..."}]
+            include_courses: Whether to include course context in RAG
+            language: 'tr' or 'en' when the client already knows it; detected otherwise
+        
+        Returns:
+            Assistant's response
+        """
+        
+        language, messages, cache_key, message_embedding, cached_response = self._prepare_academic_chat(
+            user_message, conversation_history, include_courses, language
+        )
+        if cached_response is not None:
+            return cached_response
         
         # Call Groq API
         try:
@@ -319,7 +1070,9 @@ SPECIAL NOTES:
                 stream=False
             )
             
-            return response.choices[0].message.content
+            answer = response.choices[0].message.content
+            self._cache_response(cache_key, message_embedding, answer)
+            return answer
         
         except Exception as e:
             error_msg = f"Error calling Groq API: {str(e)}"
@@ -333,36 +1086,20 @@ SPECIAL NOTES:
     def chat_stream(self,
                    user_message: str,
                    conversation_history: List[Dict[str, str]] = None,
-                   include_courses: bool = True):
+                   include_courses: bool = True,
+                   language: Optional[str] = None):
         """
         Stream response using Groq with RAG context (for real-time responses)
         
-        Yields response chunks as they arrive
+        Yields response chunks as they arrive; a cached answer is yielded in one chunk
         """
         
-        # Detect language
-        language = self.detect_language(user_message)
-        
-        # Get contexts using semantic search
-        project_context = self.get_project_context()
-        course_context = ""
-        if include_courses:
-            course_context = self.get_course_context_with_embeddings(user_message)
-        
-        # Build system prompt
-        system_prompt = self.create_system_prompt(language, project_context)
-        
-        # Build messages
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        if conversation_history:
-            messages.extend(conversation_history[-10:])
-        
-        enhanced_message = user_message
-        if course_context:
-            enhanced_message = f"{user_message}\n\n{course_context}"
-        
-        messages.append({"role": "user", "content": enhanced_message})
+        language, messages, cache_key, message_embedding, cached_response = self._prepare_academic_chat(
+            user_message, conversation_history, include_courses, language
+        )
+        if cached_response is not None:
+            yield cached_response
+            return
         
         # Stream from Groq API
         try:
@@ -375,9 +1112,12 @@ SPECIAL NOTES:
                 stream=True
             )
             
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            parts = []
+            for text in _coalesce_stream(stream):
+                parts.append(text)
+                yield text
+            
+            self._cache_response(cache_key, message_embedding, "".join(parts))
         
         except Exception as e:
             error_msg = f"Error streaming from Groq API: {str(e)}"
@@ -390,114 +1130,86 @@ SPECIAL NOTES:
     
     # ============== SOCIAL ASSISTANT METHODS ==============
     
+    def _query_venue_collection(self, collection_name: str, query_embedding: List[float], n_results: int) -> List[Dict]:
+        """Search one venue collection and return its hits as metadata/distance pairs"""
+        results = self._query_collection(
+            collection_name,
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            include=["metadatas", "distances"]  # documents are not rendered for venues
+        )
+        
+        venues = []
+        if results['ids'] and len(results['ids'][0]) > 0:
+            for idx in range(len(results['ids'][0])):
+                venues.append({
+                    'metadata': results['metadatas'][0][idx],
+                    'distance': results['distances'][0][idx]
+                })
+        return venues
+    
+    def _query_legacy_venue_collections(self, query_embedding: List[float], top_k: int) -> List[Dict]:
+        """Search the per-type venue collections concurrently; a failing one is skipped"""
+        futures = [
+            self._io_pool.submit(self._query_venue_collection, name, query_embedding, top_k)
+            for name in LEGACY_VENUE_COLLECTIONS
+        ]
+        
+        all_results = []
+        for name, future in zip(LEGACY_VENUE_COLLECTIONS, futures):
+            try:
+                all_results.extend(future.result())
+            except Exception as e:
+                print(f"Error searching {name}: {e}")
+        return all_results
+    
     def get_restaurant_context(self, query: str, top_k: int = 10) -> str:
         """
         Get relevant restaurant information using embeddings and semantic search
-        Searches both dining_places and entertainment_places collections
+        Searches the combined dining + entertainment venues collection
         """
         try:
-            all_results = []
+            query_embedding = self._encode_query(query)
             
-            # Search dining places collection
+            # One HNSW search over all venues; 2 * top_k candidates matches the
+            # candidate pool of the former top_k-per-collection searches
             try:
-                dining_collection = self.chroma_client.get_collection("dining_places")
-                query_text = f"query: {query}"
-                query_embedding = self.embedding_model.encode([query_text])[0].tolist()
-                
-                dining_results = dining_collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=top_k
-                )
-                
-                if dining_results['ids'] and len(dining_results['ids'][0]) > 0:
-                    for idx in range(len(dining_results['ids'][0])):
-                        all_results.append({
-                            'metadata': dining_results['metadatas'][0][idx],
-                            'document': dining_results['documents'][0][idx],
-                            'distance': dining_results['distances'][0][idx] if 'distances' in dining_results else None
-                        })
+                all_results = self._query_venue_collection(VENUES_COLLECTION, query_embedding, 2 * top_k)
             except Exception as e:
-                print(f"Error searching dining_places: {e}")
-            
-            # Search entertainment places collection
-            try:
-                entertainment_collection = self.chroma_client.get_collection("entertainment_places")
-                query_text = f"query: {query}"
-                query_embedding = self.embedding_model.encode([query_text])[0].tolist()
-                
-                entertainment_results = entertainment_collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=top_k
-                )
-                
-                if entertainment_results['ids'] and len(entertainment_results['ids'][0]) > 0:
-                    for idx in range(len(entertainment_results['ids'][0])):
-                        all_results.append({
-                            'metadata': entertainment_results['metadatas'][0][idx],
-                            'document': entertainment_results['documents'][0][idx],
-                            'distance': entertainment_results['distances'][0][idx] if 'distances' in entertainment_results else None
-                        })
-            except Exception as e:
-                print(f"Error searching entertainment_places: {e}")
-            
-            if not all_results:
-                return ""
+                print(f"Error searching {VENUES_COLLECTION}, using per-type collections: {e}")
+                all_results = self._query_legacy_venue_collections(query_embedding, top_k)
             
             if not all_results:
                 return ""
             
-            # Sort all results by distance from campus (closest first)
-            sorted_results = sorted(
+            # Closest top_k venues from campus; the key is parsed once per result
+            nearest_results = heapq.nsmallest(
+                top_k,
                 all_results,
                 key=lambda r: float(r['metadata'].get('distance_from_campus', 999.0))
             )
             
             # Build restaurant context
             context_parts = ["NEARBY VENUES (from database):\n"]
+            append = context_parts.append
+            
+            relevances = _relevance_percentages([result['distance'] for result in nearest_results])
             
-            for result in sorted_results[:top_k]:  # Limit to top_k results
+            for result, relevance in zip(nearest_results, relevances):
                 metadata = result['metadata']
-                document = result['document']
-                distance = result['distance']
                 
-                similarity = 1.0 - distance if distance is not None else 0.0
+                append(f"\n[Relevance: {relevance:.1f}%] {metadata['name']}")
                 
-                context_parts.append(
-                    f"\n[Relevance: {similarity*100:.1f}%] {metadata['name']}"
-                )
-                
-                # Show category (restaurant, cafe, fast_food, bar, pub)
-                if metadata.get('category'):
-                    context_parts.append(f"Category: {metadata['category']}")
-                
-                if metadata.get('cuisine_type'):
-                    context_parts.append(f"Cuisine: {metadata['cuisine_type']}")
+                # Category (restaurant, cafe, fast_food, bar, pub) and cuisine
+                _append_fields(append, metadata, VENUE_HEAD_FIELDS)
                 
                 if metadata.get('distance_from_campus'):
-                    # Convert km to meters for display
-                    dist_km = float(metadata['distance_from_campus'])
-                    if dist_km < 1.0:
-                        # Show in meters for distances less than 1 km
-                        dist_meters = int(dist_km * 1000)
-                        context_parts.append(f"Distance: {dist_meters} meters from campus")
-                    else:
-                        # Show in km for distances 1 km and above
-                        context_parts.append(f"Distance: {dist_km:.1f} km from campus")
-                
-                if metadata.get('price'):
-                    # Price is already formatted as ₺₺ symbols
-                    context_parts.append(f"Price: {metadata['price']}")
+                    append(_format_campus_distance(float(metadata['distance_from_campus'])))
                 
-                if metadata.get('address'):
-                    context_parts.append(f"Address: {metadata['address']}")
+                # Price is already formatted as ₺₺ symbols
+                _append_fields(append, metadata, VENUE_TAIL_FIELDS)
                 
-                if metadata.get('tags'):
-                    context_parts.append(f"Features: {metadata['tags']}")
-                
-                if metadata.get('phone'):
-                    context_parts.append(f"Phone: {metadata['phone']}")
-                
-                context_parts.append("")  # Empty line between restaurants
+                append("")  # Empty line between restaurants
             
             return "\n".join(context_parts)
         
@@ -510,56 +1222,33 @@ SPECIAL NOTES:
         Get relevant event information using embeddings and semantic search
         """
         try:
-            # Get the event collection from ChromaDB
-            collection = self.chroma_client.get_collection("events")
-            
             # Create query embedding
-            query_text = f"query: {query}"
-            query_embedding = self.embedding_model.encode([query_text])[0].tolist()
+            query_embedding = self._encode_query(query)
             
-            # Search in ChromaDB
-            results = collection.query(
+            # Search the event collection in ChromaDB
+            results = self._query_collection(
+                "events",
                 query_embeddings=[query_embedding],
-                n_results=top_k
+                n_results=top_k,
+                include=["metadatas", "distances"]  # documents are not rendered for events
             )
             
             if not results['ids'] or len(results['ids'][0]) == 0:
                 return ""
             
+            relevances = _relevance_percentages(results['distances'][0])
+            
             # Build event context
             context_parts = ["UPCOMING EVENTS IN ANKARA:\n"]
+            append = context_parts.append
             
-            for idx in range(len(results['ids'][0])):
-                metadata = results['metadatas'][0][idx]
-                document = results['documents'][0][idx]
-                distance = results['distances'][0][idx] if 'distances' in results else None
-                
-                similarity = 1.0 - distance if distance is not None else 0.0
+            for metadata, relevance in zip(results['metadatas'][0], relevances):
+                append(f"\n[Relevance: {relevance:.1f}%] {metadata['title']}")
                 
-                context_parts.append(
-                    f"\n[Relevance: {similarity*100:.1f}%] {metadata['title']}"
-                )
+                # Category (music, theater, workshop, comedy, other), date, venue, tickets
+                _append_fields(append, metadata, EVENT_FIELDS)
                 
-                # Show category (music, theater, workshop, comedy, other)
-                if metadata.get('category'):
-                    context_parts.append(f"Category: {metadata['category']}")
-                
-                if metadata.get('event_type'):
-                    context_parts.append(f"Type: {metadata['event_type']}")
-                
-                if metadata.get('event_date'):
-                    context_parts.append(f"Date: {metadata['event_date']}")
-                
-                if metadata.get('venue_name'):
-                    context_parts.append(f"Venue: {metadata['venue_name']}")
-                
-                if metadata.get('price_info'):
-                    context_parts.append(f"Price: {metadata['price_info']}")
-                
-                if metadata.get('ticket_url'):
-                    context_parts.append(f"Ticket URL: {metadata['ticket_url']}")
-                
-                context_parts.append("")  # Empty line between events
+                append("")  # Empty line between events
             
             return "\n".join(context_parts)
         
@@ -568,9 +1257,13 @@ SPECIAL NOTES:
             return ""
     
     def create_social_system_prompt(self, language: str) -> str:
-        """Create system prompt for social assistant"""
+        """
+        Create system prompt for social assistant
+        The shared instructions end with a language lock for the detected language, so
+        the reply language is fixed up front rather than checked after generation
+        """
         
-        return """You are the social assistant for SAGE (Student Academic Guidance and Engagement) system.
+        prompt = """You are the social assistant for SAGE (Student Academic Guidance and Engagement) system.
 You help Kolej Campus students discover restaurants, cafes, and events around campus and in Ankara.
 
 YOUR RESPONSIBILITIES:
@@ -604,7 +1297,6 @@ CRITICAL FORMATTING RULES:
 - **When user specifies a category** (e.g., "suggest cafes", "any arcades"), prioritize venues matching that category
 
 RESPONSE RULES:
-- Always respond in English
 - Use friendly and social language
 - **CRITICAL: ONLY recommend venues that are provided in the context data below**
 - **NEVER make up or hallucinate venue names, addresses, or details**
@@ -657,52 +1349,120 @@ If context is empty → Say "I don't have any cafes in my database near campus"
 EXAMPLE OF INCORRECT BEHAVIOR (DON'T DO THIS):
 User: "Any cafes near campus?"
 Response: "Try Sözen Cafe or Campus Cafe" ← WRONG! These are not in the database!"""
+        
+        return f"{prompt}\n\n{SOCIAL_LANGUAGE_LOCK[language]}"
     
-    def chat_social(self,
-                   user_message: str,
-                   conversation_history: List[Dict[str, str]] = None) -> str:
+    def _get_social_contexts(self, query: str) -> tuple:
         """
-        Generate social assistant response using Groq with restaurant and event RAG
+        Restaurant and event context for a social query, memoized on whitespace-normalized
+        query text for SOCIAL_CONTEXT_TTL seconds
+        """
+        key = " ".join(query.split())
+        cache = self._social_context_cache
         
-        Args:
-            user_message: User's query
-            conversation_history: Previous messages
+        with self._social_context_lock:
+            cached = cache.get(key)
+            if cached and time.monotonic() - cached[0] < SOCIAL_CONTEXT_TTL:
+                cache.move_to_end(key)
+                return cached[1], cached[2]
+        
+        # Both searches embed the same query: encode it once up front so the concurrent
+        # lookups below share the cached vector instead of racing to encode it twice
+        self._encode_query(query)
+        
+        # The two searches are independent ChromaDB round-trips. Events go to the I/O pool;
+        # restaurants stay on this thread because their legacy fallback submits to the pool
+        # itself, and a pool task must never block waiting on other pool tasks
+        event_future = self._io_pool.submit(self.get_event_context, query)
+        restaurant_context = self.get_restaurant_context(query)
+        event_context = event_future.result()
+        
+        # Empty context may come from a ChromaDB error; don't pin it for the whole TTL
+        if restaurant_context or event_context:
+            with self._social_context_lock:
+                cache[key] = (time.monotonic(), restaurant_context, event_context)
+                cache.move_to_end(key)
+                while len(cache) > SOCIAL_CONTEXT_CACHE_SIZE:
+                    cache.popitem(last=False)
+        
+        return restaurant_context, event_context
+    
+    def _prepare_social_chat(self,
+                             user_message: str,
+                             conversation_history: Optional[List[Dict[str, str]]],
+                             language: Optional[str] = None):
+        """
+        Detect language, retrieve venue/event context and assemble the social chat messages
         
         Returns:
-            Assistant's response
+            (language, messages, response cache key, direct response). The direct
+            response is set when no Groq call is needed, and messages is then None
         """
         
         # Detect language
-        language = self.detect_language(user_message)
+        language = self._resolve_language(user_message, language)
         
         # Get restaurant and event context using semantic search
-        restaurant_context = self.get_restaurant_context(user_message)
-        event_context = self.get_event_context(user_message)
+        restaurant_context, event_context = self._get_social_contexts(user_message)
+        categories = _venue_categories(user_message)
         
-        # Build system prompt for social assistant
-        system_prompt = self.create_social_system_prompt(language)
+        # Nothing to recommend from: the prompt would only make Groq say so
+        if not restaurant_context and not event_context and categories:
+            return language, None, None, NO_SOCIAL_CONTEXT_RESPONSES[language]
         
-        # Build messages for API
-        messages = [{"role": "system", "content": system_prompt}]
+        # Build messages for API, starting from the shared social system message
+        messages = [self._system_message('social', language)]
         
         # Add conversation history
         if conversation_history:
-            messages.extend(conversation_history[-10:])
+            messages.extend(self._history_messages(conversation_history))
         
         # Enhance user message with context
-        enhanced_message = user_message
-        context_parts = []
+        if restaurant_context and event_context:
+            enhanced_message = f"{user_message}\n\n{restaurant_context}\n\n{event_context}"
+        elif restaurant_context:
+            enhanced_message = f"{user_message}\n\n{restaurant_context}"
+        elif event_context:
+            enhanced_message = f"{user_message}\n\n{event_context}"
+        else:
+            enhanced_message = user_message
         
-        if restaurant_context:
-            context_parts.append(restaurant_context)
+        messages.append({"role": "user", "content": enhanced_message})
         
-        if event_context:
-            context_parts.append(event_context)
+        # Reuse the answer to an equivalent question asked over the same retrieved
+        # venues/events (and the same previous turn, so follow-ups stay distinct).
+        # Categories are keyed explicitly: "kafe" and "restoran" questions embed closely
+        # and can retrieve the same venues, but need different answers
+        last_turn = conversation_history[-1]['content'] if conversation_history else None
+        cache_key = ("social", language, categories, hash((restaurant_context, event_context, last_turn)))
+        return language, messages, cache_key, None
+    
+    def chat_social(self,
+                   user_message: str,
+                   conversation_history: List[Dict[str, str]] = None,
+                   language: Optional[str] = None) -> str:
+        """
+        Generate social assistant response using Groq with restaurant and event RAG
         
-        if context_parts:
-            enhanced_message = f"{user_message}\n\n" + "\n\n".join(context_parts)
+        Args:
+            user_message: User's query
+            conversation_history: Previous messages
+            language: 'tr' or 'en' when the client already knows it; detected otherwise
         
-        messages.append({"role": "user", "content": enhanced_message})
+        Returns:
+            Assistant's response
+        """
+        
+        language, messages, cache_key, direct_response = self._prepare_social_chat(
+            user_message, conversation_history, language
+        )
+        if direct_response is not None:
+            return direct_response
+        
+        message_embedding = self._message_embedding(user_message)
+        cached_response = self._get_cached_response(cache_key, message_embedding)
+        if cached_response is not None:
+            return cached_response
         
         # Call Groq API
         try:
@@ -710,12 +1470,14 @@ Response: "Try Sözen Cafe or Campus Cafe" ← WRONG! These are not in the datab
                 model=self.model,
                 messages=messages,
                 temperature=0.8,  # Slightly higher for more creative social responses
-                max_tokens=2000,
+                max_tokens=_social_max_tokens(messages),
                 top_p=0.9,
                 stream=False
             )
             
-            return response.choices[0].message.content
+            answer = response.choices[0].message.content
+            self._cache_response(cache_key, message_embedding, answer)
+            return answer
         
         except Exception as e:
             error_msg = f"Error calling Groq API: {str(e)}"
@@ -725,4 +1487,53 @@ Response: "Try Sözen Cafe or Campus Cafe" ← WRONG! These are not in the datab
                 return "Üzgünüm, şu anda yanıt oluşturamıyorum. Lütfen daha sonra tekrar deneyin."
             else:
                 return "I'm sorry, I cannot generate a response at the moment. Please try again later."
-
+    
+    def chat_social_stream(self,
+                           user_message: str,
+                           conversation_history: List[Dict[str, str]] = None,
+                           language: Optional[str] = None):
+        """
+        Stream social assistant response (for real-time responses)
+        
+        Yields response chunks as they arrive; a cached answer is yielded in one chunk
+        """
+        
+        language, messages, cache_key, direct_response = self._prepare_social_chat(
+            user_message, conversation_history, language
+        )
+        if direct_response is not None:
+            yield direct_response
+            return
+        
+        message_embedding = self._message_embedding(user_message)
+        cached_response = self._get_cached_response(cache_key, message_embedding)
+        if cached_response is not None:
+            yield cached_response
+            return
+        
+        # Stream from Groq API
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.8,  # Slightly higher for more creative social responses
+                max_tokens=_social_max_tokens(messages),
+                top_p=0.9,
+                stream=True
+            )
+            
+            parts = []
+            for text in _coalesce_stream(stream):
+                parts.append(text)
+                yield text
+            
+            self._cache_response(cache_key, message_embedding, "".join(parts))
+        
+        except Exception as e:
+            error_msg = f"Error streaming from Groq API: {str(e)}"
+            print(error_msg)
+            
+            if language == 'tr':
+                yield "Üzgünüm, şu anda yanıt oluşturamıyorum. Lütfen daha sonra tekrar deneyin."
+            else:
+                yield "I'm sorry, I cannot generate a response at the moment. Please try again later."
@@ -4,233 +4,140 @@ Works with any email provider that supports IMAP
 """
 import imaplib
 import email
-from email.header import decode_header
-from typing import List, Dict, Any
+import email.policy
+import hashlib
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import json
-from groq import Groq
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from groq import Groq, BadRequestError, RateLimitError
+import logging
 import os
 
+logger = logging.getLogger(__name__)
 
-class IMAPEmailService:
-    """Simple IMAP-based email service"""
-    
-    # Gmail IMAP Settings
-    IMAP_SERVER = "imap.gmail.com"
-    IMAP_PORT = 993
-    
-    def __init__(self):
-        self.connection = None
-        self.email_address = None
-        self.is_connected = False
-    
-    def connect(self, email_address: str, password: str) -> bool:
-        """
-        Connect to email server via IMAP
-        """
-        try:
-            # Disconnect any existing connection
-            if self.connection:
-                try:
-                    self.connection.logout()
-                except:
-                    pass
-            
-            # Connect to IMAP server with timeout
-            print(f"Attempting IMAP connection to {self.IMAP_SERVER}:{self.IMAP_PORT}")
-            self.connection = imaplib.IMAP4_SSL(self.IMAP_SERVER, self.IMAP_PORT)
-            
-            # Set a longer timeout (default is too short)
-            self.connection.sock.settimeout(60)
-            
-            print(f"SSL connection established, attempting login for {email_address}")
-            
-            # Login
-            self.connection.login(email_address, password)
-            print(f"✓ Login successful for {email_address}")
-            
-            self.email_address = email_address
-            self.is_connected = True
-            
-            return True
-        except imaplib.IMAP4.error as e:
-            error_msg = str(e)
-            print(f"✗ IMAP4.error: {error_msg}")
-            if 'authentication failed' in error_msg.lower() or 'login failed' in error_msg.lower():
-                raise Exception(f"Authentication failed. Please check:\n1. Email address is correct\n2. Using App Password (not regular password)\n3. IMAP is enabled in Gmail settings\nError: {error_msg}")
-            else:
-                raise Exception(f"IMAP error: {error_msg}")
-        except Exception as e:
-            error_msg = str(e)
-            print(f"✗ Exception during IMAP connection: {error_msg}")
-            if "EOF" in error_msg:
-                raise Exception(f"Connection closed by server. Please check:\n1. Your App Password is correct and not expired\n2. IMAP access is enabled in Gmail\n3. No firewall blocking IMAP (port 993)")
-            raise Exception(f"IMAP connection failed: {error_msg}")
+
+# Message ids per FETCH command; one round trip now covers a whole chunk
+FETCH_BATCH_SIZE = 100
+# Header fields read by _parse_email (Content-* decode the body)
+HEADER_FIELDS = ("SUBJECT", "FROM", "DATE", "CONTENT-TYPE", "CONTENT-TRANSFER-ENCODING")
+# Those headers plus the first 4 KB of the body; PEEK leaves \Seen untouched
+FETCH_ITEMS = f"(BODY.PEEK[HEADER.FIELDS ({' '.join(HEADER_FIELDS)})] BODY.PEEK[TEXT]<0.4096>)"
+# Seconds between keepalive NOOPs, under Gmail's ~30 minute idle drop
+KEEPALIVE_INTERVAL = 25 * 60
+# Extracted events per email batch, keyed by model + prompt + batch text
+EVENT_CACHE_TTL = 24 * 3600
+EVENT_CACHE_SIZE = 1024
+# Groq requests in flight at once for event extraction
+LLM_CONCURRENCY = 4
+# Subject words that mark a candidate event email; SEARCH runs server side so
+# newsletters and receipts are never fetched or sent to the LLM. IMAP SUBJECT
+# is a case-insensitive substring match; Turkish words are ASCII-only ones
+SEARCH_KEYWORDS = (
+    "meeting", "exam", "midterm", "final", "quiz", "deadline", "due", "class",
+    "lecture", "lab", "assignment", "project", "office hour", "workshop",
+    "seminar", "webinar", "conference", "interview", "career", "fair",
+    "internship", "appointment", "event", "invitation", "invite", "party",
+    "club", "tournament", "competition", "reminder",
+    "ders", "etkinlik", "seminer", "konferans", "davet"
+)
+# Senders of transactional mail
+EXCLUDED_SENDERS = ("noreply", "no-reply")
+# Sequence number at the start of each FETCH response envelope
+FETCH_ID_RE = re.compile(rb'^(\d+) \(')
+# UID item of a UID FETCH response, before or after the body sections
+FETCH_UID_RE = re.compile(rb'UID (\d+)')
+# Parsed emails kept by UID, so repeated fetches only download new mail
+EMAIL_CACHE_SIZE = 1000
+
+# Emails per LLM request; bodies are compressed by _strip_boilerplate first
+EMAILS_PER_BATCH = 3
+# Email body characters kept per email and sent to the LLM
+LLM_BODY_CHARS = 800
+# Boilerplate that never yields an event: quoted lines, the quoted reply
+# below an "On ... wrote:" (or Turkish "... şunu yazdı:") line, signatures
+QUOTED_LINE_RE = re.compile(r'^>.*$', re.M)
+QUOTED_REPLY_RE = re.compile(r'^(?:On [^\n]+(?:\n[^\n]*)?wrote|[^\n]+ şunu yazdı):.*', re.M | re.S)
+SIGNATURE_RE = re.compile(r'^-- ?$.*', re.M | re.S)
+# Long tracking/meeting URLs are cut to their host, which is all the LLM needs
+LONG_URL_RE = re.compile(r'(https?://[^/\s]+)/\S{40,}')
+WHITESPACE_RE = re.compile(r'\s+')
+# Rate limit backoff: Retry-After when sent, else the reset headers plus a
+# safety margin, else a flat default; never longer than the cap
+RATE_LIMIT_DEFAULT_WAIT = 60
+RATE_LIMIT_MAX_WAIT = 120
+RATE_LIMIT_RESET_MARGIN = 1.1
+RATE_LIMIT_RESET_HEADERS = ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+# Reset headers are Go-style durations such as "7.66s" or "2m59.56s"
+RESET_DURATION_RE = re.compile(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+(?:\.\d+)?)s)?')
+
+
+def _search_criteria(since_date: str, keywords) -> List[str]:
+    """IMAP SEARCH keys: SINCE, then any keyword in the subject from non-transactional senders"""
+    criteria = ['SINCE', since_date]
     
-    def disconnect(self):
-        """Close IMAP connection and clear session data"""
-        if self.connection:
-            try:
-                self.connection.close()
-                self.connection.logout()
-            except:
-                pass
-        self.connection = None
-        self.email_address = None
-        self.is_connected = False
+    # OR takes two keys, so n keywords nest as OR k1 OR k2 ... k(n-1) kn
+    keywords = list(keywords or ())
+    for index, keyword in enumerate(keywords):
+        if index < len(keywords) - 1:
+            criteria.append('OR')
+        criteria += ['SUBJECT', f'"{keyword}"']
     
-    def fetch_emails(self, days: int = 30, max_results: int = 50) -> List[Dict[str, Any]]:
-        """
-        Fetch emails from inbox
-        """
-        if not self.is_connected:
-            raise Exception("Not connected. Please login first.")
-        
-        try:
-            # Reconnect if connection is stale
-            try:
-                self.connection.noop()  # Test connection
-            except:
-                print("⚠️ Connection stale, reconnecting...")
-                raise Exception("Connection expired. Please login again.")
-            
-            # Select inbox - make sure we're reading from INBOX only
-            status, messages = self.connection.select("INBOX")
-            print(f"📬 Selected INBOX: {status}, {messages[0].decode()} messages total")
-            
-            # Calculate date for search
-            since_date = (datetime.now() - timedelta(days=days)).strftime("%d-%b-%Y")
-            print(f"🔍 Searching for emails since {since_date}")
-            
-            # Search for emails since date in INBOX
-            status, messages = self.connection.search(None, f'SINCE {since_date}')
-            
-            if status != "OK":
-                raise Exception("Failed to search emails")
-            
-            # Get email IDs
-            email_ids = messages[0].split()
-            print(f"📧 Found {len(email_ids)} emails in INBOX since {since_date}")
-            email_ids = email_ids[-max_results:]  # Get last N emails
-            print(f"📤 Fetching last {len(email_ids)} emails")
-            
-            emails = []
-            
-            for email_id in email_ids:
-                try:
-                    # Fetch email
-                    status, msg_data = self.connection.fetch(email_id, "(RFC822)")
-                    
-                    if status != "OK":
-                        continue
-                    
-                    # Parse email
-                    raw_email = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-                    
-                    # Decode subject
-                    subject = self._decode_header(msg.get("Subject", ""))
-                    
-                    # Get from address
-                    from_header = msg.get("From", "")
-                    
-                    # Get date
-                    date_str = msg.get("Date", "")
-                    
-                    # Get body
-                    body = self._get_email_body(msg)
-                    
-                    email_data = {
-                        "id": email_id.decode(),
-                        "subject": subject,
-                        "from": from_header,
-                        "date": date_str,
-                        "body": body[:1000],  # First 1000 chars
-                        "full_body": body
-                    }
-                    
-                    print(f"  📨 {subject[:50]}... from {from_header[:30]}")
-                    emails.append(email_data)
-                    
-                except Exception as e:
-                    print(f"Error parsing email {email_id}: {e}")
-                    continue
-            
-            print(f"✅ Successfully fetched {len(emails)} emails from INBOX")
-            return emails
-            
-        except Exception as e:
-            error_msg = str(e)
-            if "EOF" in error_msg or "socket" in error_msg.lower():
-                raise Exception("Connection lost. Please login again with your Gmail credentials.")
-            raise Exception(f"Failed to fetch emails: {error_msg}")
+    # Automated senders are only dropped alongside the keyword filter; an
+    # unfiltered search (keywords=None) returns every message
+    if keywords:
+        for sender in EXCLUDED_SENDERS:
+            criteria += ['NOT', 'FROM', f'"{sender}"']
+    return criteria
+
+
+def _rate_limit_wait(error) -> float:
+    """Seconds to wait after a RateLimitError, read from its response headers"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
     
-    def _decode_header(self, header):
-        """Decode email header"""
-        if not header:
-            return ""
-        
-        decoded = decode_header(header)
-        result = ""
-        
-        for part, encoding in decoded:
-            if isinstance(part, bytes):
-                result += part.decode(encoding or "utf-8", errors="ignore")
-            else:
-                result += part
-        
-        return result
+    try:
+        return min(float(headers.get("retry-after")), RATE_LIMIT_MAX_WAIT)
+    except (TypeError, ValueError):
+        pass
     
-    def _get_email_body(self, msg):
-        """Extract email body"""
-        body = ""
-        
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    try:
-                        body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-                        break
-                    except:
-                        pass
-        else:
-            try:
-                body = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
-            except:
-                body = str(msg.get_payload())
-        
-        return body
+    resets = []
+    for header in RATE_LIMIT_RESET_HEADERS:
+        match = RESET_DURATION_RE.fullmatch(headers.get(header) or "")
+        if match and any(match.groups()):
+            hours, minutes, seconds = (float(group or 0) for group in match.groups())
+            resets.append((hours * 3600 + minutes * 60 + seconds) * RATE_LIMIT_RESET_MARGIN)
     
-    def extract_events_with_llm(self, emails: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """
-        Use Groq LLM to extract calendar events from emails
-        Processes in batches to avoid token limits
-        Includes retry logic for rate limiting
-        """
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        if not groq_api_key:
-            raise Exception("GROQ_API_KEY not set")
-        
-        client = Groq(api_key=groq_api_key)
-        
-        # Use smaller, more token-efficient model
-        model = "llama-3.1-8b-instant"  # Much more efficient, still capable
-        
-        # Prepare emails for LLM
-        email_texts = []
-        for e in emails:
-            # Use full_body instead of truncated body for better extraction
-            body_text = e.get('full_body', e.get('body', ''))
-            email_texts.append(f"Subject: {e['subject']}\nFrom: {e['from']}\nDate: {e['date']}\nBody: {body_text[:800]}")  # Reduced from 1500 to 800 chars
-        
-        print(f"📧 Processing {len(email_texts)} emails in batches")
-        
-        system_prompt = """You are an AI assistant specialized in extracting calendar events from student emails.
+    return min(max(resets, default=RATE_LIMIT_DEFAULT_WAIT), RATE_LIMIT_MAX_WAIT)
+
+
+def _is_json_validation_error(error) -> bool:
+    """Whether a BadRequestError is JSON mode's json_validate_failed"""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        details = body.get("error") if isinstance(body.get("error"), dict) else body
+        if details.get("code") == "json_validate_failed":
+            return True
+    return getattr(error, "code", None) == "json_validate_failed" or "json_validate_failed" in str(error)
+
+
+def _strip_boilerplate(text: str) -> str:
+    """Drop quoted replies, signatures and long URL paths, then collapse whitespace"""
+    text = QUOTED_REPLY_RE.sub('', text)
+    text = SIGNATURE_RE.sub('', text)
+    text = QUOTED_LINE_RE.sub('', text)
+    text = LONG_URL_RE.sub(r'\1', text)
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+# Byte-identical across batches so Groq's prompt cache can reuse the prefix;
+# anything that varies per call belongs in the user message
+EVENT_EXTRACTION_PROMPT = """You are an AI assistant specialized in extracting calendar events from student emails.
 
-CRITICAL: You MUST respond with ONLY valid JSON array format. No other text, no explanations, just the JSON array.
+CRITICAL: You MUST respond with ONLY a valid JSON object whose "events" key holds the array of events. No other text, no explanations.
 
 Focus on extracting these types of events:
 - Academic: Classes, lectures, exams, assignments, project deadlines, office hours, academic meetings
@@ -240,22 +147,24 @@ Focus on extracting these types of events:
 - Other: Events that don't fit above categories
 
 RESPONSE FORMAT - Return ONLY this JSON structure, nothing else:
-[
-  {
-    "title": "Clear event title",
-    "description": "Detailed description of the event",
-    "event_date": "2026-01-15 14:00",
-    "location": "Physical location or online link",
-    "event_type": "academic",
-    "priority": "high",
-    "source": "email",
-    "organizer": "Who is organizing the event"
-  }
-]
+{
+  "events": [
+    {
+      "title": "Clear event title",
+      "description": "Detailed description of the event",
+      "event_date": "2026-01-15 14:00",
+      "location": "Physical location or online link",
+      "event_type": "academic",
+      "priority": "high",
+      "source": "email",
+      "organizer": "Who is organizing the event"
+    }
+  ]
+}
 
 CRITICAL RULES:
-1. Return ONLY the JSON array, no markdown, no code blocks, no extra text
-2. If no events found, return: []
+1. Return ONLY the JSON object, no markdown, no code blocks, no extra text
+2. If no events found, return: {"events": []}
 3. Extract ALL relevant events from the emails
 4. Use EXACT event_type values: "academic", "social", "student_activity", "career", or "other" (lowercase, use underscore for student_activity)
 5. Use priority: "high" (exams/important events), "medium" (meetings), "low" (social)
@@ -300,105 +209,440 @@ EXAMPLES WITH 24-HOUR FORMAT:
 - Email: "deadline March 1" (no time) → event_date: "2026-03-01 09:00"
 - Email: "party at 8 PM Friday" → event_date: "2026-XX-XX 20:00"
 """
-        
-        all_events = []
-        batch_size = 5  # Reduced from 10 to 5 emails per batch to save tokens
-        total_batches = (len(email_texts) + batch_size - 1) // batch_size
-        
-        print(f"🔄 Will process {total_batches} batches of up to {batch_size} emails each")
-        
-        try:
-            for batch_num in range(total_batches):
-                start_idx = batch_num * batch_size
-                end_idx = min(start_idx + batch_size, len(email_texts))
-                batch_emails = email_texts[start_idx:end_idx]
+
+
+class IMAPEmailService:
+    """Simple IMAP-based email service"""
+    
+    # Gmail IMAP Settings
+    IMAP_SERVER = "imap.gmail.com"
+    IMAP_PORT = 993
+    
+    def __init__(self):
+        self.connection = None
+        self.email_address = None
+        self.is_connected = False
+        # Kept in memory only, so a dropped session can log in again
+        self._password = None
+        # The keepalive NOOP and FETCH share one socket
+        self._lock = threading.RLock()
+        self._keepalive_stop = None
+        # INBOX stays selected for the life of a session
+        self._inbox_selected = False
+        # Parsed emails by UID (LRU order), valid while UIDVALIDITY is unchanged
+        self._email_cache = OrderedDict()
+        self._uidvalidity = None
+        # Event cache: _event_cache_key -> (stored_at, events), LRU order
+        self._event_cache = OrderedDict()
+        self._event_cache_lock = threading.Lock()
+        self._llm_pool = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY)
+        # Created on first extraction and reused, keeping its connections warm
+        self._groq_client = None
+        self._groq_client_lock = threading.Lock()
+    
+    def connect(self, email_address: str, password: str) -> bool:
+        """
+        Connect to email server via IMAP
+        """
+        with self._lock:
+            try:
+                # Disconnect any existing connection
+                if self.connection:
+                    try:
+                        self.connection.logout()
+                    except:
+                        pass
                 
-                combined_emails = "\n\n---\n\n".join(batch_emails)
-                print(f"📦 Batch {batch_num + 1}/{total_batches}: Processing emails {start_idx + 1}-{end_idx} ({len(combined_emails)} chars)")
+                # Connect to IMAP server with timeout
+                logger.debug(f"Attempting IMAP connection to {self.IMAP_SERVER}:{self.IMAP_PORT}")
+                self.connection = imaplib.IMAP4_SSL(self.IMAP_SERVER, self.IMAP_PORT)
                 
-                # Retry logic for rate limiting
-                max_retries = 3
-                retry_count = 0
-                response = None
+                # Set a longer timeout (default is too short)
+                self.connection.sock.settimeout(60)
                 
-                while retry_count < max_retries:
-                    try:
-                        response = client.chat.completions.create(
-                            model=model,
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": f"Extract calendar events from these emails:\n\n{combined_emails}"}
-                            ],
-                            temperature=0.2,
-                            max_tokens=2000  # Reduced from 3000
-                        )
-                        break  # Success, exit retry loop
-                    except Exception as api_error:
-                        error_str = str(api_error)
-                        if "rate_limit_exceeded" in error_str or "429" in error_str:
-                            # Extract wait time from error message
-                            import re
-                            wait_match = re.search(r'try again in (\d+)m', error_str)
-                            if wait_match:
-                                wait_minutes = int(wait_match.group(1))
-                                wait_seconds = wait_minutes * 60
-                                print(f"  ⏳ Rate limit hit. Waiting {wait_minutes} minutes ({wait_seconds}s)...")
-                                import time
-                                time.sleep(min(wait_seconds, 120))  # Cap at 2 minutes max
-                                retry_count += 1
-                            else:
-                                # If can't parse wait time, wait 60 seconds
-                                print(f"  ⏳ Rate limit hit. Waiting 60 seconds...")
-                                import time
-                                time.sleep(60)
-                                retry_count += 1
-                        else:
-                            # Different error, don't retry
-                            raise api_error
+                logger.debug(f"SSL connection established, attempting login for {email_address}")
                 
-                if response is None:
-                    print(f"  ❌ Failed to get response after {max_retries} retries")
-                    continue  # Skip this batch
+                # Login
+                self.connection.login(email_address, password)
+                logger.info(f"✓ Login successful for {email_address}")
                 
-                content = response.choices[0].message.content
-                print(f"  🤖 Response received ({len(content)} chars)")
-                print(f"  📄 RAW RESPONSE: {content[:500]}")  # Print first 500 chars to debug
+                if email_address != self.email_address:
+                    self._clear_email_cache()
+                self.email_address = email_address
+                self._password = password
+                self._inbox_selected = False
+                self.is_connected = True
+                self._start_keepalive()
                 
-                # Try to parse JSON
-                batch_events = []
+                return True
+            except imaplib.IMAP4.error as e:
+                error_msg = str(e)
+                logger.error(f"✗ IMAP4.error: {error_msg}")
+                if 'authentication failed' in error_msg.lower() or 'login failed' in error_msg.lower():
+                    raise Exception(f"Authentication failed. Please check:\n1. Email address is correct\n2. Using App Password (not regular password)\n3. IMAP is enabled in Gmail settings\nError: {error_msg}")
+                else:
+                    raise Exception(f"IMAP error: {error_msg}")
+            except Exception as e:
+                error_msg = str(e)
+                logger.error(f"✗ Exception during IMAP connection: {error_msg}")
+                if "EOF" in error_msg:
+                    raise Exception(f"Connection closed by server. Please check:\n1. Your App Password is correct and not expired\n2. IMAP access is enabled in Gmail\n3. No firewall blocking IMAP (port 993)")
+                raise Exception(f"IMAP connection failed: {error_msg}")
+        
+    def disconnect(self):
+        """Close IMAP connection and clear session data"""
+        with self._lock:
+            self._stop_keepalive()
+            if self.connection:
                 try:
-                    batch_events = json.loads(content)
-                    print(f"  ✅ Parsed {len(batch_events)} events from batch")
+                    self.connection.close()
+                    self.connection.logout()
+                except:
+                    pass
+            self.connection = None
+            self.email_address = None
+            self._password = None
+            self._inbox_selected = False
+            self._clear_email_cache()
+            self.is_connected = False
+    
+    def _clear_email_cache(self):
+        self._email_cache.clear()
+        self._uidvalidity = None
+    
+    def _start_keepalive(self):
+        """Send a NOOP every KEEPALIVE_INTERVAL so the server keeps the session"""
+        self._stop_keepalive()
+        stop = threading.Event()
+        self._keepalive_stop = stop
+        threading.Thread(target=self._keepalive, args=(stop,), daemon=True).start()
+    
+    def _stop_keepalive(self):
+        if self._keepalive_stop:
+            self._keepalive_stop.set()
+            self._keepalive_stop = None
+    
+    def _keepalive(self, stop: threading.Event):
+        while not stop.wait(KEEPALIVE_INTERVAL):
+            with self._lock:
+                if stop.is_set() or not self.connection:
+                    return
+                try:
+                    self.connection.noop()
                 except Exception as e:
-                    print(f"  ⚠️ JSON parse error: {str(e)[:100]}")
-                    # Try to extract JSON from markdown code blocks
-                    import re
-                    json_match = re.search(r'```(?:json)?\s*(\[.*?\])\s*```', content, re.DOTALL)
-                    if json_match:
+                    # fetch_emails logs in again on its next call
+                    logger.warning(f"⚠️ IMAP keepalive failed: {e}")
+    
+    def fetch_emails(self, days: int = 30, max_results: int = 50, batch_size: int = FETCH_BATCH_SIZE,
+                     keywords=SEARCH_KEYWORDS) -> List[Dict[str, Any]]:
+        """
+        Fetch emails from inbox
+        Only emails whose subject contains one of keywords are searched for
+        (pass None to search every email); messages are requested in
+        message-set chunks of batch_size ids
+        """
+        if not self.is_connected:
+            raise Exception("Not connected. Please login first.")
+        
+        with self._lock:
+            try:
+                # Reconnect if connection is stale
+                try:
+                    self.connection.noop()  # Test connection
+                except (imaplib.IMAP4.abort, OSError):
+                    logger.warning("⚠️ Connection stale, reconnecting...")
+                    self.connect(self.email_address, self._password)
+                except:
+                    raise Exception("Connection expired. Please login again.")
+                
+                # Select inbox - make sure we're reading from INBOX only.
+                # Only the first fetch of a session pays for SELECT; the NOOP
+                # above already brings the selected mailbox up to date
+                if not self._inbox_selected:
+                    status, messages = self.connection.select("INBOX")
+                    if status != "OK":
+                        raise Exception("Failed to select INBOX")
+                    logger.debug(f"📬 Selected INBOX: {status}, {messages[0].decode()} messages total")
+                    self._inbox_selected = True
+                    
+                    # UIDs from another UIDVALIDITY may name different messages
+                    _, uidvalidity = self.connection.response("UIDVALIDITY")
+                    if uidvalidity != self._uidvalidity:
+                        self._email_cache.clear()
+                        self._uidvalidity = uidvalidity
+                
+                # Calculate date for search
+                since_date = (datetime.now() - timedelta(days=days)).strftime("%d-%b-%Y")
+                logger.debug(f"🔍 Searching for emails since {since_date}")
+                
+                # Search for candidate event emails since date in INBOX. UIDs
+                # are stable across sessions, unlike sequence numbers
+                status, messages = self.connection.uid("SEARCH", *_search_criteria(since_date, keywords))
+                
+                if status != "OK":
+                    raise Exception("Failed to search emails")
+                
+                # Get email UIDs
+                uids = messages[0].split()
+                logger.debug(f"📧 Found {len(uids)} emails in INBOX since {since_date}")
+                uids = uids[-max_results:]  # Get last N emails
+                
+                # Only mail not fetched before is downloaded
+                new_uids = [uid for uid in uids if uid not in self._email_cache]
+                logger.info(f"📤 Fetching {len(new_uids)} new of the last {len(uids)} emails")
+                
+                for start in range(0, len(new_uids), batch_size):
+                    chunk = new_uids[start:start + batch_size]
+                    
+                    # Fetch the whole chunk with one message-set command
+                    status, msg_data = self.connection.uid("FETCH", b",".join(chunk), FETCH_ITEMS)
+                    
+                    if status != "OK":
+                        logger.warning(f"Failed to fetch emails {chunk[0].decode()}-{chunk[-1].decode()}")
+                        continue
+                    
+                    # Each message arrives as (envelope, bytes) tuples, one per
+                    # section, closed by a bytes item; a new sequence number
+                    # starts a message and its UID may be in any of the parts
+                    fetched = []
+                    for item in msg_data:
+                        prefix = item[0] if isinstance(item, tuple) else item
+                        if not isinstance(prefix, bytes):
+                            continue
+                        
+                        if FETCH_ID_RE.match(prefix):
+                            fetched.append([None, b"", b""])
+                        if not fetched:
+                            continue
+                        
+                        uid_match = FETCH_UID_RE.search(prefix)
+                        if uid_match:
+                            fetched[-1][0] = uid_match.group(1)
+                        
+                        if isinstance(item, tuple):
+                            if b"BODY[TEXT]" in prefix:
+                                fetched[-1][2] = item[1]
+                            else:
+                                fetched[-1][1] = item[1]
+                    
+                    for uid, header_bytes, text_bytes in fetched:
+                        if uid is None:
+                            continue
+                        
                         try:
-                            batch_events = json.loads(json_match.group(1))
-                            print(f"  ✅ Extracted {len(batch_events)} events from markdown")
-                        except Exception as markdown_error:
-                            print(f"  ⚠️ Markdown JSON parse error: {str(markdown_error)[:100]}")
-                    else:
-                        print(f"  ⚠️ No valid JSON in batch {batch_num + 1}, trying alternative patterns...")
-                        # Try to find JSON array anywhere in the response
-                        array_match = re.search(r'\[[\s\S]*?\{[\s\S]*?\}[\s\S]*?\]', content)
-                        if array_match:
-                            try:
-                                batch_events = json.loads(array_match.group(0))
-                                print(f"  ✅ Extracted {len(batch_events)} events from found JSON array")
-                            except Exception as array_error:
-                                print(f"  ⚠️ Array JSON parse error: {str(array_error)[:100]}")
+                            email_data = self._parse_email(uid.decode(), header_bytes, text_bytes)
+                        except Exception as e:
+                            logger.warning(f"Error parsing email {uid.decode()}: {e}")
+                            continue
+                        
+                        logger.debug(f"  📨 {email_data['subject'][:50]}... from {email_data['from'][:30]}")
+                        self._email_cache[uid] = email_data
                 
-                all_events.extend(batch_events)
+                emails = []
+                for uid in uids:
+                    email_data = self._email_cache.get(uid)
+                    if email_data is not None:
+                        self._email_cache.move_to_end(uid)
+                        emails.append(email_data)
+                
+                while len(self._email_cache) > EMAIL_CACHE_SIZE:
+                    self._email_cache.popitem(last=False)
                 
-                # Small delay to avoid rate limiting
-                if batch_num < total_batches - 1:
-                    import time
-                    time.sleep(0.5)
+                logger.info(f"✅ Successfully fetched {len(emails)} emails from INBOX")
+                return emails
+                
+            except Exception as e:
+                error_msg = str(e)
+                if "EOF" in error_msg or "socket" in error_msg.lower():
+                    raise Exception("Connection lost. Please login again with your Gmail credentials.")
+                raise Exception(f"Failed to fetch emails: {error_msg}")
+    
+    def _parse_email(self, email_id: str, header_bytes: bytes, text_bytes: bytes) -> Dict[str, Any]:
+        """Build the email dict from the fetched header and capped TEXT sections"""
+        # policy.default decodes RFC 2047 headers and picks each part's charset
+        msg = email.message_from_bytes(header_bytes + text_bytes, policy=email.policy.default)
+        
+        # One field, already in the form the LLM prompt uses
+        return {
+            "id": email_id,
+            "subject": str(msg.get("Subject", "")),
+            "from": str(msg.get("From", "")),
+            "date": str(msg.get("Date", "")),
+            "body": _strip_boilerplate(self._get_email_body(msg))[:LLM_BODY_CHARS]
+        }
+    
+    def _get_email_body(self, msg) -> str:
+        """Extract the first plain-text part; a single-part message is used whatever its text type"""
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain" and not part.is_attachment():
+                return self._part_text(part)
+        
+        if not msg.is_multipart() and msg.get_content_maintype() == "text":
+            return self._part_text(msg)
+        return ""
+    
+    def _part_text(self, part) -> str:
+        if str(part.get("Content-Transfer-Encoding", "")).strip().lower() == "base64":
+            # The 4 KB cap can cut base64 mid-quantum; decode whole quanta only
+            data = "".join(part.get_payload().split())
+            part.set_payload(data[:len(data) - len(data) % 4])
+        
+        try:
+            return part.get_content()
+        except LookupError:
+            # Unknown charset
+            return part.get_payload(decode=True).decode("utf-8", errors="ignore")
+    
+    def _event_cache_key(self, model: str, system_prompt: str, combined_emails: str) -> str:
+        """Hash everything that determines a batch's extraction; prompt edits invalidate it"""
+        return hashlib.sha256(f"{model}\0{system_prompt}\0{combined_emails}".encode()).hexdigest()
+    
+    def _get_cached_events(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the events cached for a batch, or None when missing or older than EVENT_CACHE_TTL"""
+        with self._event_cache_lock:
+            entry = self._event_cache.get(key)
+            if entry is None:
+                return None
+            stored_at, events = entry
+            if time.monotonic() - stored_at > EVENT_CACHE_TTL:
+                del self._event_cache[key]
+                return None
+            self._event_cache.move_to_end(key)
+            return list(events)
+    
+    def _cache_events(self, key: str, events: List[Dict[str, Any]]) -> None:
+        with self._event_cache_lock:
+            self._event_cache[key] = (time.monotonic(), list(events))
+            self._event_cache.move_to_end(key)
+            while len(self._event_cache) > EVENT_CACHE_SIZE:
+                self._event_cache.popitem(last=False)
+    
+    def _log_prompt_cache(self, response) -> None:
+        """Report how much of the prompt Groq served from its prefix cache"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None)
+        if isinstance(prompt_tokens, int) and isinstance(cached_tokens, int) and prompt_tokens:
+            logger.debug(f"  💾 Prompt cache: {cached_tokens}/{prompt_tokens} tokens ({cached_tokens / prompt_tokens:.0%})")
+    
+    def _extract_batch(self, client, model: str, total_batches: int, batch_num: int, batch_emails: List[str]) -> List[Dict[str, Any]]:
+        """Extract events from one batch of email texts, using the event cache"""
+        combined_emails = "\n\n---\n\n".join(batch_emails)
+        logger.debug(f"📦 Batch {batch_num + 1}/{total_batches}: {len(batch_emails)} emails ({len(combined_emails)} chars)")
+        
+        # Re-running extraction over the same inbox resends identical batches
+        cache_key = self._event_cache_key(model, EVENT_EXTRACTION_PROMPT, combined_emails)
+        cached_events = self._get_cached_events(cache_key)
+        if cached_events is not None:
+            logger.debug(f"  ♻️ Using {len(cached_events)} cached events for batch {batch_num + 1}")
+            return cached_events
+        
+        # Retry logic for rate limiting
+        max_retries = 3
+        retry_count = 0
+        response = None
+        
+        while retry_count < max_retries:
+            try:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": EVENT_EXTRACTION_PROMPT},
+                        {"role": "user", "content": f"Extract calendar events from these emails:\n\n{combined_emails}"}
+                    ],
+                    temperature=0.2,
+                    max_tokens=2000,  # Reduced from 3000
+                    # JSON mode: the reply is always one parseable object
+                    response_format={"type": "json_object"}
+                )
+                break  # Success, exit retry loop
+            except RateLimitError as api_error:
+                wait_seconds = _rate_limit_wait(api_error)
+                logger.warning(f"  ⏳ Rate limit hit. Waiting {wait_seconds:.1f}s...")
+                time.sleep(wait_seconds)
+                retry_count += 1
+            except BadRequestError as api_error:
+                # Only JSON mode rejecting this batch's output is survivable: the
+                # batch is lost and nothing is cached, so the next run retries it.
+                # Any other API error (bad key, outage) propagates
+                if not _is_json_validation_error(api_error):
+                    raise
+                logger.error(f"  ❌ Groq rejected the JSON for batch {batch_num + 1}: {str(api_error)[:200]}")
+                return []
+        
+        if response is None:
+            logger.error(f"  ❌ Failed to get response after {max_retries} retries")
+            return []  # Skip this batch
+        
+        content = response.choices[0].message.content
+        logger.debug(f"  🤖 Response received ({len(content)} chars)")
+        self._log_prompt_cache(response)
+        logger.debug(f"  📄 RAW RESPONSE: {content[:500]}")  # First 500 chars
+        
+        # Parse JSON
+        batch_events = []
+        parsed = False
+        try:
+            batch_events = json.loads(content).get("events", [])
+            if not isinstance(batch_events, list):
+                raise ValueError("'events' is not an array")
+            parsed = True
+            logger.debug(f"  ✅ Parsed {len(batch_events)} events from batch")
+        except (ValueError, AttributeError) as e:
+            batch_events = []
+            logger.warning(f"  ⚠️ JSON parse error in batch {batch_num + 1}: {str(e)[:100]}")
+        
+        # Unparseable responses are retried next run rather than cached
+        if parsed:
+            self._cache_events(cache_key, batch_events)
+        return batch_events
+    
+    def _get_groq_client(self):
+        """Return the shared Groq client, creating it on first use"""
+        with self._groq_client_lock:
+            if self._groq_client is None:
+                groq_api_key = os.getenv("GROQ_API_KEY")
+                if not groq_api_key:
+                    raise Exception("GROQ_API_KEY not set")
+                self._groq_client = Groq(api_key=groq_api_key)
+            return self._groq_client
+    
+    def extract_events_with_llm(self, emails: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Use Groq LLM to extract calendar events from emails
+        Processes in batches to avoid token limits
+        Includes retry logic for rate limiting
+        """
+        client = self._get_groq_client()
+        
+        # Use smaller, more token-efficient model
+        model = "llama-3.1-8b-instant"  # Much more efficient, still capable
+        
+        # Prepare emails for LLM
+        email_texts = []
+        for e in emails:
+            email_texts.append(f"Subject: {e['subject']}\nFrom: {e['from']}\nDate: {e['date']}\n{e['body']}")
+        
+        logger.debug(f"📧 Processing {len(email_texts)} emails in batches")
+        
+        all_events = []
+        batch_size = EMAILS_PER_BATCH
+        total_batches = (len(email_texts) + batch_size - 1) // batch_size
+        
+        logger.debug(f"🔄 Will process {total_batches} batches of up to {batch_size} emails each")
+        
+        try:
+            batches = [email_texts[start:start + batch_size] for start in range(0, len(email_texts), batch_size)]
+            
+            # Batches run concurrently, at most LLM_CONCURRENCY at a time across
+            # all callers; rate limits are handled by the per-batch retry
+            extract = partial(self._extract_batch, client, model, total_batches)
+            results = self._llm_pool.map(extract, range(total_batches), batches)
+            for batch_events in results:
+                all_events.extend(batch_events)
             
-            print(f"🎯 Total events extracted from all batches: {len(all_events)}")
+            logger.info(f"🎯 Total events extracted from all batches: {len(all_events)}")
             return {
                 "success": True,
                 "events": all_events,
@@ -406,7 +650,7 @@ EXAMPLES WITH 24-HOUR FORMAT:
             }
             
         except Exception as e:
-            print(f"💥 LLM extraction exception: {str(e)}")
+            logger.error(f"💥 LLM extraction exception: {str(e)}")
             raise Exception(f"LLM extraction failed: {str(e)}")
 
 
@@ -18,6 +18,8 @@ from psycopg2.extras import Json
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from app.core.vector_store import DISTANCE_SPACE, EMBEDDING_MODEL_NAME, collection_metadata
+
 # Configuration
 CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
@@ -28,7 +30,7 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "sage_user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "sage_password")
 
 # Embedding model
-MODEL_NAME = "intfloat/e5-large-v2"
+MODEL_NAME = EMBEDDING_MODEL_NAME
 
 # Similarity threshold for duplicate detection (86%)
 SIMILARITY_THRESHOLD = 0.86
@@ -148,11 +150,21 @@ def setup_chromadb(reset: bool = False):
         except:
             pass
     
-    # Get or create collection (safer method for newer ChromaDB versions)
-    collection = client.get_or_create_collection(
-        name="tedu_courses",
-        metadata={"hnsw:space": "cosine"}  # Use cosine similarity for better semantic search
-    )
+    metadata = collection_metadata({"hnsw:space": "cosine"})  # Use cosine similarity for better semantic search
+    try:
+        collection = client.get_collection("tedu_courses")
+    except Exception:
+        collection = None
+    
+    # The distance space and HNSW parameters are fixed at creation; passing them to
+    # get_or_create_collection only relabels an existing collection. Rebuild one made
+    # with another space (the run below re-adds every course to the empty collection)
+    if collection is not None and (collection.metadata or {}).get("hnsw:space") != DISTANCE_SPACE:
+        print(f"⚠️  Recreating ChromaDB collection tedu_courses with {DISTANCE_SPACE} distance")
+        client.delete_collection("tedu_courses")
+        collection = client.create_collection(name="tedu_courses", metadata=metadata)
+    elif collection is None:
+        collection = client.get_or_create_collection(name="tedu_courses", metadata=metadata)
     print("✓ ChromaDB collection ready: tedu_courses (cosine distance)")
     
     return collection
@@ -208,6 +220,14 @@ def setup_postgres():
         CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department)
     """)
     
+    # Create trigram index for the keyword fallback search
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_courses_search_trgm ON courses USING GIN (
+            (coalesce(course_title, '') || ' ' || coalesce(catalog_description, '') || ' ' || course_code) gin_trgm_ops
+        )
+    """)
+    
     conn.commit()
     print("✓ PostgreSQL tables created/verified")
     
@@ -337,7 +357,7 @@ def process_courses(metadata_files: List[str], reset: bool = False):
         course_text = create_course_text(course)
         
         # Create embedding for this course
-        course_embedding = model.encode([course_text])[0]
+        course_embedding = model.encode([course_text], normalize_embeddings=True)[0]
         
         # Check if this course is a duplicate
         is_dup, similarity, similar_code = is_duplicate_course(collection, course_embedding, course_code)
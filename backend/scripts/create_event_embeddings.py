@@ -14,6 +14,7 @@ import chromadb
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from app.services.bubilet_scraper import scrape_ankara_events
+from app.core.vector_store import EMBEDDING_MODEL_NAME, collection_metadata
 import logging
 from datetime import datetime
 
@@ -34,7 +35,7 @@ CHROMA_HOST = os.getenv('CHROMA_HOST', 'chromadb')
 CHROMA_PORT = int(os.getenv('CHROMA_PORT', '8000'))
 
 # Embedding model
-MODEL_NAME = "intfloat/e5-large-v2"
+MODEL_NAME = EMBEDDING_MODEL_NAME
 
 
 def create_event_text(event: dict) -> str:
@@ -162,7 +163,7 @@ def store_in_chromadb(events: list, model: SentenceTransformer):
         
         collection = client.create_collection(
             name="events",
-            metadata={"description": "Event embeddings for social assistant"}
+            metadata=collection_metadata({"description": "Event embeddings for social assistant"})
         )
         
         logger.info("Generating embeddings for events...")
@@ -184,7 +185,7 @@ def store_in_chromadb(events: list, model: SentenceTransformer):
             text_with_prefix = f"passage: {text}"
             
             # Generate embedding
-            embedding = model.encode(text_with_prefix, convert_to_numpy=True)
+            embedding = model.encode(text_with_prefix, convert_to_numpy=True, normalize_embeddings=True)
             
             # Prepare metadata (ChromaDB doesn't accept None values)
             metadata = {
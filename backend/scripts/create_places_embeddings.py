@@ -18,6 +18,7 @@ from app.services.foursquare_service import (
     CAMPUS_LAT, 
     CAMPUS_LON
 )
+from app.core.vector_store import DISTANCE_SPACE, EMBEDDING_MODEL_NAME, VENUES_COLLECTION, collection_metadata
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -37,7 +38,7 @@ CHROMA_HOST = os.getenv('CHROMA_HOST', 'chromadb')
 CHROMA_PORT = int(os.getenv('CHROMA_PORT', '8000'))
 
 # Embedding model
-MODEL_NAME = "intfloat/e5-large-v2"
+MODEL_NAME = EMBEDDING_MODEL_NAME
 
 
 def create_place_text(place: dict, venue_type: str) -> str:
@@ -229,26 +230,35 @@ def store_in_postgres(places: list, venue_type: str):
 
 
 def store_in_chromadb(places: list, venue_type: str, model: SentenceTransformer):
-    """Store place embeddings in ChromaDB - works with deduplicated places"""
+    """
+    Store place embeddings in the combined ChromaDB venues collection - works with deduplicated places
+    Only the entries of this venue_type are replaced; metadata "venue_type" tells the kinds apart
+    """
     try:
         # Connect to ChromaDB
         client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
         
-        # Collection name based on venue type
-        collection_name = f"{venue_type}_places"
-        
-        # Get or create collection
+        metadata = collection_metadata({"description": "Dining and entertainment place embeddings for social assistant"})
         try:
-            collection = client.get_collection(collection_name)
-            # Delete existing collection to refresh
-            client.delete_collection(collection_name)
-        except:
-            pass
+            existing = client.get_collection(VENUES_COLLECTION)
+        except Exception:
+            existing = None
         
-        collection = client.create_collection(
-            name=collection_name,
-            metadata={"description": f"{venue_type.capitalize()} place embeddings for social assistant"}
-        )
+        # Chroma fixes the distance space and HNSW parameters at creation, so a collection
+        # built with another space is rebuilt (main() refills both venue types, a
+        # single-type run must be followed by the other). The original metadata is read
+        # before get_or_create_collection, which would overwrite it without re-indexing
+        if existing is not None and (existing.metadata or {}).get("hnsw:space") != DISTANCE_SPACE:
+            logger.warning(f"Recreating {VENUES_COLLECTION} collection with {DISTANCE_SPACE} distance")
+            client.delete_collection(VENUES_COLLECTION)
+            collection = client.create_collection(name=VENUES_COLLECTION, metadata=metadata)
+        elif existing is not None:
+            collection = existing
+        else:
+            collection = client.get_or_create_collection(name=VENUES_COLLECTION, metadata=metadata)
+        
+        # Delete existing entries of this type to refresh
+        collection.delete(where={"venue_type": venue_type})
         
         logger.info(f"Generating embeddings for {venue_type} places...")
         
@@ -282,7 +292,7 @@ def store_in_chromadb(places: list, venue_type: str, model: SentenceTransformer)
             text_with_prefix = f"passage: {text}"
             
             # Generate embedding
-            embedding = model.encode(text_with_prefix, convert_to_numpy=True)
+            embedding = model.encode(text_with_prefix, convert_to_numpy=True, normalize_embeddings=True)
             
             # Prepare metadata (ChromaDB doesn't accept None values or arrays)
             metadata = {
@@ -317,6 +327,13 @@ def store_in_chromadb(places: list, venue_type: str, model: SentenceTransformer)
         
         logger.info(f"Stored {len(places_by_id)} unique {venue_type} place embeddings in ChromaDB")
         
+        # Drop the per-type collection used before venues were combined
+        try:
+            client.delete_collection(f"{venue_type}_places")
+            logger.info(f"Deleted legacy collection {venue_type}_places")
+        except:
+            pass
+        
     except Exception as e:
         logger.error(f"Error storing in ChromaDB: {e}")
         raise
@@ -14,6 +14,7 @@ import chromadb
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from app.services.foursquare_service import fetch_restaurants_from_foursquare, TED_UNIVERSITY_LAT, TED_UNIVERSITY_LON
+from app.core.vector_store import EMBEDDING_MODEL_NAME
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -33,7 +34,7 @@ CHROMA_HOST = os.getenv('CHROMA_HOST', 'chromadb')
 CHROMA_PORT = int(os.getenv('CHROMA_PORT', '8000'))
 
 # Embedding model
-MODEL_NAME = "intfloat/e5-large-v2"
+MODEL_NAME = EMBEDDING_MODEL_NAME
 
 
 def create_restaurant_text(restaurant: dict) -> str:
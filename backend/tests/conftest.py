@@ -13,13 +13,16 @@ sys.path.insert(0, str(backend_dir))
 
 # Mock external dependencies that might not be installed
 sys.modules['groq'] = MagicMock()
+sys.modules['httpx'] = MagicMock()
 sys.modules['langdetect'] = MagicMock()
 sys.modules['sentence_transformers'] = MagicMock()
 sys.modules['chromadb'] = MagicMock()
 sys.modules['psycopg2'] = MagicMock()
 sys.modules['psycopg2.extras'] = MagicMock()
+sys.modules['psycopg2.pool'] = MagicMock()
 sys.modules['torch'] = MagicMock()
 sys.modules['transformers'] = MagicMock()
+sys.modules['onnxruntime'] = MagicMock()
 
 
 @pytest.fixture
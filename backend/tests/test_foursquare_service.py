@@ -7,7 +7,11 @@ from app.services.foursquare_service import (
     haversine,
     format_price_range,
     fetch_venues_from_foursquare,
+    parse_foursquare_venue_v3,
+    extract_tags_v3,
     CAMPUS_LAT,
+    DINING_CATEGORIES,
+    FOURSQUARE_MAX_LIMIT,
     CAMPUS_LON
 )
 
@@ -67,7 +71,7 @@ class TestFoursquareHelpers:
 class TestFoursquareAPI:
     """Test Foursquare API integration"""
     
-    @patch('app.services.foursquare_service.requests.get')
+    @patch('app.services.foursquare_service._SESSION.get')
     def test_fetch_venues_dining_success(self, mock_get, mock_env_vars):
         """Test successful fetching of dining venues"""
         # Mock API response
@@ -96,7 +100,7 @@ class TestFoursquareAPI:
         assert 'distance' in venues[0]
         assert 'price_range' in venues[0]
     
-    @patch('app.services.foursquare_service.requests.get')
+    @patch('app.services.foursquare_service._SESSION.get')
     def test_fetch_venues_entertainment_success(self, mock_get, mock_env_vars):
         """Test successful fetching of entertainment venues"""
         mock_response = MagicMock()
@@ -121,7 +125,7 @@ class TestFoursquareAPI:
         assert venues[0]['name'] == 'Art Gallery'
         assert venues[0]['category'] == 'art_gallery'
     
-    @patch('app.services.foursquare_service.requests.get')
+    @patch('app.services.foursquare_service._SESSION.get')
     def test_fetch_venues_api_error(self, mock_get, mock_env_vars):
         """Test handling of API errors"""
         mock_get.side_effect = Exception("API Error")
@@ -130,7 +134,7 @@ class TestFoursquareAPI:
         
         assert venues == []
     
-    @patch('app.services.foursquare_service.requests.get')
+    @patch('app.services.foursquare_service._SESSION.get')
     def test_fetch_venues_empty_response(self, mock_get, mock_env_vars):
         """Test handling of empty API response"""
         mock_response = MagicMock()
@@ -142,7 +146,7 @@ class TestFoursquareAPI:
         
         assert venues == []
     
-    @patch('app.services.foursquare_service.requests.get')
+    @patch('app.services.foursquare_service._SESSION.get')
     def test_fetch_venues_distance_calculation(self, mock_get, mock_env_vars):
         """Test that distance is calculated correctly"""
         mock_response = MagicMock()
@@ -169,7 +173,7 @@ class TestFoursquareAPI:
         assert isinstance(venues[0]['distance'], float)
         assert venues[0]['distance'] >= 0
     
-    @patch('app.services.foursquare_service.requests.get')
+    @patch('app.services.foursquare_service._SESSION.get')
     def test_fetch_venues_missing_optional_fields(self, mock_get, mock_env_vars):
         """Test handling of venues with missing optional fields"""
         mock_response = MagicMock()
@@ -195,3 +199,95 @@ class TestFoursquareAPI:
         # Should handle missing fields gracefully
         assert 'rating' in venues[0]
         assert 'price_range' in venues[0]
+
+    
+    @patch.multiple('app.services.foursquare_service',
+                    FOURSQUARE_CLIENT_ID='test_client_id',
+                    FOURSQUARE_CLIENT_SECRET='test_client_secret')
+    @patch('app.services.foursquare_service._SESSION.get')
+    def test_fetch_venues_skips_malformed_results(self, mock_get):
+        """Test that malformed payloads and entries are skipped"""
+        good_response = MagicMock(status_code=200)
+        good_response.json.return_value = {
+            'results': [{'fsq_place_id': '1', 'name': 'Arcade', 'distance': 100}, 'not-a-venue']
+        }
+        bad_response = MagicMock(status_code=200)
+        bad_response.json.return_value = ['unexpected']
+        mock_get.side_effect = [good_response, bad_response]
+        
+        venues = fetch_venues_from_foursquare('entertainment', limit=10)
+        
+        assert len(venues) == 1
+        assert venues[0]['name'] == 'Arcade'
+        assert venues[0]['category'] == 'arcade'
+
+    
+    @patch.multiple('app.services.foursquare_service',
+                    FOURSQUARE_CLIENT_ID='test_client_id',
+                    FOURSQUARE_CLIENT_SECRET='test_client_secret')
+    @patch('app.services.foursquare_service._SESSION.get')
+    def test_fetch_venues_one_request_per_category(self, mock_get):
+        """Test one capped request is issued for each category"""
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {'results': []}
+        mock_get.return_value = mock_response
+        
+        fetch_venues_from_foursquare('dining', limit=200)
+        
+        assert mock_get.call_count == len(DINING_CATEGORIES)
+        assert mock_get.call_args.kwargs['params']['limit'] == FOURSQUARE_MAX_LIMIT
+
+
+class TestFoursquareParsing:
+    """Test v3 venue parsing"""
+    
+    def test_parse_venue_v3_full(self):
+        """Test parsing a v3 venue with all common fields"""
+        venue = {
+            'fsq_place_id': 'abc',
+            'name': 'Off Cafe',
+            'latitude': 39.925,
+            'longitude': 32.862,
+            'distance': 130,
+            'categories': [{'fsq_category_id': '63be6904847c3692a84b9bb6', 'name': 'Cafe'}],
+            'location': {'address': 'Ziya Gökalp Cd.', 'locality': 'Çankaya', 'region': 'Ankara'},
+            'price': 2,
+            'verified': True
+        }
+        
+        result = parse_foursquare_venue_v3(venue)
+        
+        assert result['name'] == 'Off Cafe'
+        assert result['category'] == 'cafe'
+        assert result['fsq_id'] == 'abc'
+        assert result['distance_from_campus'] == 0.13
+        assert result['address'] == 'Ziya Gökalp Cd., Çankaya, Ankara'
+        assert result['country'] == 'TR'
+        assert result['price'] == '₺₺₺'
+        assert result['tags'] == ['verified', 'cafe']
+    
+    def test_parse_venue_v3_minimal(self):
+        """Test parsing a v3 venue with missing optional fields"""
+        venue = {'latitude': 39.925, 'longitude': 32.862}
+        
+        result = parse_foursquare_venue_v3(venue, requested_category='restaurant')
+        
+        assert result['name'] == 'Unnamed'
+        assert result['category'] == 'restaurant'
+        assert result['address'] is None
+        assert result['price'] is None
+        assert result['tags'] == []
+        assert isinstance(result['distance_from_campus'], float)
+    
+    def test_extract_tags_v3_features(self):
+        """Test feature flags are mapped to tags"""
+        venue = {
+            'categories': [{'name': 'Restaurant'}],
+            'features': {
+                'payment': {'credit_cards': True},
+                'food_and_drink': {'alcohol': False},
+                'amenities': {'wifi': True, 'parking': None}
+            }
+        }
+        
+        assert extract_tags_v3(venue) == ['restaurant', 'credit_cards', 'wifi']
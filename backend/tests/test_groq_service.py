@@ -3,7 +3,20 @@ Unit tests for Groq Service (Academic and Social Assistants)
 """
 import pytest
 from unittest.mock import Mock, MagicMock, patch, call
-from app.services.groq_service import GroqAcademicService
+from app.services.groq_service import (
+    GroqAcademicService,
+    get_embedding_model,
+    get_chroma_client,
+    _detect_language_sample
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_clients():
+    """The embedding model and ChromaDB client are process-wide; rebuild them from each test's mocks"""
+    get_embedding_model.cache_clear()
+    get_chroma_client.cache_clear()
+    _detect_language_sample.cache_clear()
 
 
 class TestGroqAcademicService:
@@ -18,7 +31,10 @@ class TestGroqAcademicService:
         
         assert service.api_key == "test_groq_api_key"
         assert service.model == "llama-3.3-70b-versatile"
-        mock_groq.assert_called_once_with(api_key="test_groq_api_key")
+        mock_groq.assert_called_once()
+        assert mock_groq.call_args[1]['api_key'] == "test_groq_api_key"
+        assert mock_groq.call_args[1]['max_retries'] == 3
+        assert 'http_client' in mock_groq.call_args[1]
         mock_transformer.assert_called_once()
         mock_chroma.assert_called_once()
     
@@ -59,8 +75,27 @@ class TestGroqAcademicService:
     @patch('app.services.groq_service.Groq')
     @patch('app.services.groq_service.SentenceTransformer')
     @patch('app.services.groq_service.chromadb.HttpClient')
-    @patch('app.services.groq_service.psycopg2.connect')
-    def test_get_project_context_success(self, mock_connect, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+    def test_detect_language_turkish_heuristic(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test Turkish letters and stopwords short-circuit langdetect"""
+        service = GroqAcademicService()
+        
+        with patch('app.services.groq_service.detect', return_value='en') as mock_detect:
+            assert service.detect_language("Bu dersin hocası kim?") == 'tr'
+            assert service.detect_language("CMPE 213 nedir") == 'tr'
+            mock_detect.assert_not_called()
+            
+            assert service.detect_language("Who teaches CMPE 213?") == 'en'
+            assert service.detect_language("Who teaches CMPE 213?") == 'en'
+            mock_detect.assert_called_once()
+            
+            # Dotless i must not make English text Turkish via case folding
+            assert service.detect_language("I like it") == 'en'
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_get_project_context_success(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
         """Test successful retrieval of project context"""
         # Mock database response
         mock_cursor = MagicMock()
@@ -73,7 +108,7 @@ class TestGroqAcademicService:
         ]
         mock_conn = MagicMock()
         mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
+        mock_pool.return_value.getconn.return_value = mock_conn
         
         service = GroqAcademicService()
         result = service.get_project_context()
@@ -85,10 +120,10 @@ class TestGroqAcademicService:
     @patch('app.services.groq_service.Groq')
     @patch('app.services.groq_service.SentenceTransformer')
     @patch('app.services.groq_service.chromadb.HttpClient')
-    @patch('app.services.groq_service.psycopg2.connect')
-    def test_get_project_context_database_error(self, mock_connect, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_get_project_context_database_error(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
         """Test handling of database errors when fetching project context"""
-        mock_connect.side_effect = Exception("Database connection failed")
+        mock_pool.side_effect = Exception("Database connection failed")
         
         service = GroqAcademicService()
         result = service.get_project_context()
@@ -130,8 +165,8 @@ class TestGroqAcademicService:
     @patch('app.services.groq_service.Groq')
     @patch('app.services.groq_service.SentenceTransformer')
     @patch('app.services.groq_service.chromadb.HttpClient')
-    @patch('app.services.groq_service.psycopg2.connect')
-    def test_get_restaurant_context_success(self, mock_connect, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_get_restaurant_context_success(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
         """Test successful retrieval of restaurant context"""
         # Mock ChromaDB collections
         mock_dining_collection = MagicMock()
@@ -198,6 +233,8 @@ class TestGroqAcademicService:
     @patch('app.services.groq_service.chromadb.HttpClient')
     def test_chat_social(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
         """Test social chat response generation"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
         mock_chat = MagicMock()
         mock_completion = MagicMock()
         mock_completion.choices = [
@@ -215,3 +252,664 @@ class TestGroqAcademicService:
                 assert "Here are some cafe recommendations" in result
                 mock_chat.completions.create.assert_called_once()
 
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_get_project_context_cached(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test project context is served from cache and rebuilt only when documents change"""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = {'doc_count': 1, 'last_changed': '2026-01-01'}
+        mock_cursor.fetchall.return_value = [
+            {'title': 'SAGE Overview', 'content': 'SAGE is a student assistance system.', 'document_type': 'overview'}
+        ]
+        mock_conn = mock_pool.return_value.getconn.return_value
+        mock_conn.closed = 0
+        mock_conn.cursor.return_value = mock_cursor
+        
+        service = GroqAcademicService()
+        first = service.get_project_context()
+        second = service.get_project_context()
+        
+        assert first == second
+        assert 'SAGE Overview' in first
+        assert mock_pool.return_value.getconn.call_count == 1
+        
+        # Expired TTL with unchanged version only runs the probe
+        service._project_context_cache = (0.0,) + service._project_context_cache[1:]
+        assert service.get_project_context() == first
+        assert mock_pool.return_value.getconn.call_count == 2
+        assert mock_cursor.fetchall.call_count == 1
+        
+        # Changed version rebuilds the context
+        service._project_context_cache = (0.0,) + service._project_context_cache[1:]
+        mock_cursor.fetchone.return_value = {'doc_count': 2, 'last_changed': '2026-02-01'}
+        service.get_project_context()
+        assert mock_cursor.fetchall.call_count == 2
+        
+        # One pool, and every borrowed connection is returned to it
+        mock_pool.assert_called_once()
+        assert mock_pool.return_value.putconn.call_count == 3
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_get_relevant_project_context(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test only the documents most similar to the query are sent"""
+        import numpy as np
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = {'doc_count': 2, 'last_changed': '2026-01-01'}
+        mock_cursor.fetchall.return_value = [
+            {'title': 'SAGE Overview', 'content': 'SAGE is a student assistance system.', 'document_type': 'overview'},
+            {'title': 'Deployment', 'content': 'Run docker compose up.', 'document_type': 'guide'}
+        ]
+        mock_pool.return_value.getconn.return_value.cursor.return_value = mock_cursor
+        encode = mock_transformer.return_value.encode
+        
+        service = GroqAcademicService()
+        encode.side_effect = lambda texts, **kwargs: (
+            np.array([[1.0, 0.0], [0.0, 1.0]]) if texts[0].startswith("passage: ") else np.array([[0.1, 0.9]])
+        )
+        
+        context = service.get_relevant_project_context("How do I deploy SAGE?", top_k=1)
+        
+        assert 'Deployment' in context
+        assert 'SAGE Overview' not in context
+        
+        # Document embeddings are reused while the documents version is unchanged
+        service.get_relevant_project_context("How is SAGE deployed?", top_k=1)
+        passage_calls = [c for c in encode.call_args_list if c[0][0][0].startswith("passage: ")]
+        assert len(passage_calls) == 1
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.EMBEDDING_BACKEND', 'onnx')
+    @patch('app.services.groq_service.EMBEDDING_NUM_THREADS', 3)
+    def test_init_onnx_backend(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test the embedding model can be loaded on the ONNX backend"""
+        import onnxruntime
+        GroqAcademicService()
+        
+        session_options = onnxruntime.SessionOptions.return_value
+        mock_transformer.assert_called_once_with(
+            "intfloat/e5-large-v2",
+            backend="onnx",
+            model_kwargs={
+                "file_name": "onnx/model_qint8_avx512_vnni.onnx",
+                "session_options": session_options
+            }
+        )
+        assert session_options.intra_op_num_threads == 3
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.torch')
+    @patch('app.services.groq_service.EMBEDDING_NUM_THREADS', 6)
+    def test_init_sets_torch_threads(self, mock_torch, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test the torch backend is configured with the encoder thread count"""
+        GroqAcademicService()
+        
+        mock_torch.set_num_threads.assert_called_once_with(6)
+        mock_torch.set_num_interop_threads.assert_called_once_with(1)
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_encode_query_memoized(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test query embeddings are computed once per normalized query"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        service = GroqAcademicService()
+        mock_transformer.return_value.encode.reset_mock()  # ignore the warm-up encode
+        first = service._encode_query("cafes near  campus")
+        second = service._encode_query(" cafes near campus ")
+        
+        assert first == second
+        mock_transformer.return_value.encode.assert_called_once_with(
+            ["query: cafes near campus"], batch_size=1, convert_to_numpy=True, normalize_embeddings=True
+        )
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_encode_queries_batches_misses(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test only uncached queries are encoded, in one batch"""
+        import numpy as np
+        encode = mock_transformer.return_value.encode
+        encode.return_value = np.array([[1.0, 0.0]])
+        
+        service = GroqAcademicService()
+        encode.reset_mock()  # ignore the warm-up encode
+        service._encode_query("cafes")
+        
+        encode.return_value = np.array([[0.0, 1.0], [0.5, 0.5]])
+        results = service._encode_queries(["cafes", "concerts", "courses", "concerts"])
+        
+        assert results == [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5], [0.0, 1.0]]
+        encode.assert_called_with(["query: concerts", "query: courses"], batch_size=2, convert_to_numpy=True,
+                                 normalize_embeddings=True)
+        assert encode.call_count == 2
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_get_restaurant_context_encodes_once(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test both venue collections share a single query embedding"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        mock_chroma.return_value.get_collection.return_value.query.return_value = {
+            'ids': [['1']],
+            'documents': [['Off Cafe']],
+            'metadatas': [[{'name': 'Off Cafe', 'distance_from_campus': 0.13}]],
+            'distances': [[0.2]]
+        }
+        
+        service = GroqAcademicService()
+        mock_transformer.return_value.encode.reset_mock()  # ignore the warm-up encode
+        result = service.get_restaurant_context("cafe")
+        
+        assert 'Off Cafe' in result
+        assert mock_transformer.return_value.encode.call_count == 1
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_get_restaurant_context_collection_error(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test the per-type fallback skips a failing collection without dropping the other"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        
+        dining_collection = MagicMock()
+        dining_collection.query.return_value = {
+            'ids': [['1']],
+            'documents': [['Off Cafe']],
+            'metadatas': [[{'name': 'Off Cafe', 'distance_from_campus': 0.13}]],
+            'distances': [[0.2]]
+        }
+        
+        def get_collection(name):
+            if name in ("venues", "entertainment_places"):
+                raise Exception("Collection not found")
+            return dining_collection
+        
+        mock_chroma.return_value.get_collection.side_effect = get_collection
+        
+        service = GroqAcademicService()
+        result = service.get_restaurant_context("cafe")
+        
+        assert 'Off Cafe' in result
+        # Venue documents are never rendered, so they are not fetched
+        assert dining_collection.query.call_args[1]['include'] == ["metadatas", "distances"]
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_fallback_course_search(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test keyword fallback searches the trigram-indexed expression"""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            {
+                'course_code': 'CMPE 213',
+                'course_title': 'Data Structures',
+                'catalog_description': 'Lists, trees and graphs.',
+                'instructor': 'Dr. Jane Doe'
+            }
+        ]
+        mock_conn = mock_pool.return_value.getconn.return_value
+        mock_conn.closed = 0
+        mock_conn.cursor.return_value = mock_cursor
+        
+        service = GroqAcademicService()
+        result = service._fallback_course_search("data structures", top_k=3)
+        
+        assert 'CMPE 213 - Data Structures' in result
+        assert 'Instructor: Dr. Jane Doe' in result
+        sql, params = mock_cursor.execute.call_args[0]
+        assert 'word_similarity' in sql
+        assert params == ("%data structures%", "data structures", 3)
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.ThreadedConnectionPool')
+    def test_fallback_course_search_without_pg_trgm(self, mock_pool, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test keyword fallback still answers when pg_trgm cannot be installed"""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = None
+        mock_cursor.fetchall.return_value = [
+            {
+                'course_code': 'CMPE 213',
+                'course_title': 'Data Structures',
+                'catalog_description': None,
+                'instructor': None
+            }
+        ]
+        mock_conn = mock_pool.return_value.getconn.return_value
+        mock_conn.closed = 0
+        mock_conn.cursor.return_value = mock_cursor
+        
+        service = GroqAcademicService()
+        result = service._fallback_course_search("data structures", top_k=3)
+        
+        assert 'CMPE 213 - Data Structures' in result
+        statements = [call[0][0] for call in mock_cursor.execute.call_args_list]
+        assert statements[0] == "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+        sql, params = mock_cursor.execute.call_args[0]
+        assert 'word_similarity' not in sql
+        assert params == ("%data structures%", 3)
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_chat_search_query_uses_history_course_codes(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test course codes from recent assistant replies are added to the search query"""
+        import numpy as np
+        encode = mock_transformer.return_value.encode
+        encode.side_effect = lambda texts, **kwargs: np.array([[0.1, 0.2, 0.3]] * len(texts))
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = "It covers trees."
+        mock_groq.return_value.chat.completions.create.return_value = mock_response
+        
+        service = GroqAcademicService()
+        service.get_project_context = MagicMock(return_value="SAGE PROJECT DOCS")
+        service.get_course_context_with_embeddings = MagicMock(return_value="")
+        
+        history = [
+            {"role": "user", "content": "Which course teaches data structures?"},
+            {"role": "assistant", "content": "That is CMPE 213, followed by CMPE 223 and CMPE 322."}
+        ]
+        service.chat("What does it cover?", conversation_history=history)
+        
+        search_query = service.get_course_context_with_embeddings.call_args[0][0]
+        assert search_query == "Which course teaches data structures? CMPE 213 CMPE 223 What does it cover?"
+        
+        # Message and search query embeddings come from one batched forward pass
+        assert encode.call_args[0][0] == [
+            "query: What does it cover?",
+            "query: Which course teaches data structures? CMPE 213 CMPE 223 What does it cover?"
+        ]
+        
+        # Static system prompt first, then the concurrently fetched project context
+        messages = mock_groq.return_value.chat.completions.create.call_args[1]['messages']
+        assert messages[0] == {"role": "system", "content": service.create_system_prompt('en')}
+        assert messages[0] is service._system_message('academic', 'en')
+        assert messages[1] == {"role": "system", "content": "SAGE PROJECT DOCS"}
+        assert messages[2:4] == history
+        assert messages[-1]['content'] == "What does it cover?"
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_chat_response_cache(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test equivalent questions reuse a cached answer only within the same course context"""
+        import numpy as np
+        encode = mock_transformer.return_value.encode
+        create = mock_groq.return_value.chat.completions.create
+        create.return_value.choices = [MagicMock(message=MagicMock(content="The final exam is in June."))]
+        
+        service = GroqAcademicService()
+        service.get_project_context = MagicMock(return_value="SAGE")
+        service.get_course_context_with_embeddings = MagicMock(return_value="")
+        
+        encode.return_value = np.array([[1.0, 0.0]])
+        assert service.chat("When is the exam?") == "The final exam is in June."
+        
+        # Paraphrase embedding within the similarity threshold is served from cache
+        encode.return_value = np.array([[0.99, 0.05]])
+        assert service.chat("When's the exam?") == "The final exam is in June."
+        assert create.call_count == 1
+        
+        # Same question about a different course in the history goes to the model
+        history = [{"role": "assistant", "content": "CMPE 213 is a second-year course."}]
+        service.chat("When is the exam?", conversation_history=history)
+        assert create.call_count == 2
+        
+        # Near-identical questions about different courses never share an answer
+        encode.return_value = np.array([[0.0, 1.0]])
+        service.chat("Who teaches CMPE 113?")
+        service.chat("Who teaches CMPE 114?")
+        assert create.call_count == 4
+        
+        # The same code-less follow-up in two unrelated conversations is a miss
+        encode.side_effect = lambda texts, **kwargs: np.array([[0.5, 0.5]] * (len(texts) if isinstance(texts, list) else 1))
+        service.chat("Tell me more", conversation_history=[
+            {"role": "user", "content": "How do I register for the library?"},
+            {"role": "assistant", "content": "Use the student portal."}
+        ])
+        service.chat("Tell me more", conversation_history=[
+            {"role": "user", "content": "Where is the dorm office?"},
+            {"role": "assistant", "content": "In building B."}
+        ])
+        assert create.call_count == 6
+    
+    def test_trim_history_token_budget(self):
+        """Test history is trimmed oldest-first by approximate token count"""
+        from app.services.groq_service import _trim_history
+        history = [
+            {"role": "user", "content": "a" * 4000},
+            {"role": "assistant", "content": "b" * 2000},
+            {"role": "user", "content": "c" * 2000},
+        ]
+        
+        assert _trim_history(history, max_tokens=1500) == history[1:]
+        assert _trim_history(history, max_tokens=2500) == history
+        # The newest message survives even when it alone exceeds the budget
+        assert _trim_history(history, max_tokens=100) == history[2:]
+        assert _trim_history([], max_tokens=100) == []
+    
+    def test_venue_categories(self):
+        """Test category tags are extracted from Turkish and English venue questions"""
+        from app.services.groq_service import _venue_categories
+        
+        assert _venue_categories("Kampüse yakın kafeler ve restoranlar?") == ('cafe', 'restaurant')
+        assert _venue_categories("Is the cafeteria open?") == ('cafeteria',)
+        assert _venue_categories("Tatlıcı ya da dondurma önerir misin") == ('dessert_shop',)
+        assert _venue_categories("Any concerts this weekend?") == ('event',)
+        assert _venue_categories("Thanks, have a nice day") == ()
+        assert _venue_categories("Any good pubs or bars?") == ('dining_drinking',)
+        
+        # English stems only match whole words
+        assert _venue_categories("Is there public transport to campus?") == ()
+        assert _venue_categories("Where is my publication listed?") == ()
+        assert _venue_categories("I will eventually graduate") == ()
+        assert _venue_categories("Barely passed the quiz") == ()
+        assert _venue_categories("Mekanik dersi ne zaman?") == ()
+        assert _venue_categories("Konservatuvar binası nerede?") == ()
+    
+    def test_social_max_tokens(self):
+        """Test the social output budget grows with retrieved items and is capped"""
+        from app.services.groq_service import _social_max_tokens
+        venues = "NEARBY VENUES (from database):\n" + "\n[Relevance: 90.0%] Off Cafe\n" * 3
+        
+        assert _social_max_tokens([{"role": "user", "content": "Hi"}]) == 256
+        assert _social_max_tokens([{"role": "user", "content": f"Cafes?\n\n{venues}"}]) == 544
+        assert _social_max_tokens([{"role": "user", "content": venues * 20}]) == 2000
+    
+    def test_quantize_embedding_preserves_cosine(self):
+        """Test int8 cache embeddings reproduce float cosine similarity closely"""
+        import numpy as np
+        from app.services.groq_service import _quantize_embedding
+        rng = np.random.default_rng(0)
+        a, b = rng.normal(size=(2, 1024)).astype(np.float32)
+        a /= np.linalg.norm(a)
+        b = 0.95 * a + 0.05 * b / np.linalg.norm(b)
+        b /= np.linalg.norm(b)
+        
+        (qa, sa), (qb, sb) = _quantize_embedding(a), _quantize_embedding(b)
+        
+        assert qa.dtype == np.int8
+        assert abs(int(qa.astype(np.int32) @ qb.astype(np.int32)) * sa * sb - float(a @ b)) < 0.01
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_get_restaurant_context_single_venues_query(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test venues are searched with one query on the combined collection"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        venues = mock_chroma.return_value.get_collection.return_value
+        venues.query.return_value = {
+            'ids': [['1', '2']],
+            'metadatas': [[
+                {'name': 'Far Bowling', 'venue_type': 'entertainment', 'distance_from_campus': 3.2},
+                {'name': 'Near Cafe', 'venue_type': 'dining', 'distance_from_campus': 0.2}
+            ]],
+            'distances': [[0.1, 0.4]]
+        }
+        
+        service = GroqAcademicService()
+        result = service.get_restaurant_context("something fun", top_k=5)
+        
+        mock_chroma.return_value.get_collection.assert_called_once_with("venues")
+        assert venues.query.call_args[1]['n_results'] == 10
+        assert result.index('Near Cafe') < result.index('Far Bowling')
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_model_and_client_shared_across_instances(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test the embedding model is loaded, and warmed up, once per process"""
+        first = GroqAcademicService()
+        second = GroqAcademicService()
+        
+        assert first.embedding_model is second.embedding_model
+        assert first.chroma_client is second.chroma_client
+        mock_transformer.assert_called_once()
+        mock_chroma.assert_called_once()
+        mock_transformer.return_value.encode.assert_called_once_with(["query: warmup"])
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.STREAM_FLUSH_INTERVAL', 60)
+    def test_chat_stream_coalesces_chunks(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test streamed tokens are batched per line and empty deltas skipped"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[1.0, 0.0]])
+        tokens = ["CMPE", " 213", None, " covers\n", "trees", " and", " graphs."]
+        mock_groq.return_value.chat.completions.create.return_value = [
+            MagicMock(choices=[MagicMock(delta=MagicMock(content=token))]) for token in tokens
+        ]
+        
+        service = GroqAcademicService()
+        service.get_project_context = MagicMock(return_value="SAGE")
+        service.get_course_context_with_embeddings = MagicMock(return_value="")
+        
+        chunks = list(service.chat_stream("What does CMPE 213 cover?"))
+        
+        assert chunks == ["CMPE 213 covers\n", "trees and graphs."]
+        
+        # Streamed answers share the response cache with chat
+        assert service.chat("What does CMPE 213 cover?") == "CMPE 213 covers\ntrees and graphs."
+        mock_groq.return_value.chat.completions.create.assert_called_once()
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_chat_social_response_cache(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test paraphrased social questions over the same context reuse the cached answer"""
+        import numpy as np
+        encode = mock_transformer.return_value.encode
+        create = mock_groq.return_value.chat.completions.create
+        create.return_value.choices = [MagicMock(message=MagicMock(content="Try Off Cafe."))]
+        
+        service = GroqAcademicService()
+        service.get_restaurant_context = MagicMock(return_value="NEARBY VENUES: Off Cafe")
+        service.get_event_context = MagicMock(return_value="")
+        
+        encode.return_value = np.array([[1.0, 0.0]])
+        assert service.chat_social("Is there a cafe near campus?") == "Try Off Cafe."
+        encode.return_value = np.array([[0.98, 0.1]])
+        assert service.chat_social("Any cafes close to campus?") == "Try Off Cafe."
+        assert create.call_count == 1
+        
+        # Different retrieved venues mean a different answer
+        service.get_restaurant_context.return_value = "NEARBY VENUES: Kahve Dunyasi"
+        service._social_context_cache.clear()
+        service.chat_social("Any cafes close to campus?")
+        assert create.call_count == 2
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    @patch('app.services.groq_service.STREAM_FLUSH_INTERVAL', 60)
+    def test_chat_social_stream(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test social answers stream in coalesced chunks and are cached once complete"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[1.0, 0.0]])
+        create = mock_groq.return_value.chat.completions.create
+        create.return_value = [
+            MagicMock(choices=[MagicMock(delta=MagicMock(content=token))])
+            for token in ["Try", " Off Cafe.\n", "It is", " 130 m away."]
+        ]
+        
+        service = GroqAcademicService()
+        service.get_restaurant_context = MagicMock(return_value="NEARBY VENUES: Off Cafe")
+        service.get_event_context = MagicMock(return_value="")
+        
+        chunks = list(service.chat_social_stream("Is there a cafe near campus?"))
+        
+        assert chunks == ["Try Off Cafe.\n", "It is 130 m away."]
+        assert create.call_args[1]['stream'] is True
+        assert create.call_args[1]['max_tokens'] == 256
+        
+        # The completed answer feeds the shared response cache
+        assert service.chat_social("Is there a cafe near campus?") == "Try Off Cafe.\nIt is 130 m away."
+        assert create.call_count == 1
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_social_context_cache(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test repeated social queries reuse retrieved context until it expires"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[1.0, 0.0]])
+        service = GroqAcademicService()
+        service.get_restaurant_context = MagicMock(return_value="NEARBY VENUES: Off Cafe")
+        service.get_event_context = MagicMock(return_value="")
+        
+        assert service._get_social_contexts("cafe near campus") == ("NEARBY VENUES: Off Cafe", "")
+        assert service._get_social_contexts("  cafe near   campus ") == ("NEARBY VENUES: Off Cafe", "")
+        assert service.get_restaurant_context.call_count == 1
+        assert service.get_event_context.call_count == 1
+        
+        with patch('app.services.groq_service.SOCIAL_CONTEXT_TTL', 0):
+            service._get_social_contexts("cafe near campus")
+        assert service.get_restaurant_context.call_count == 2
+        
+        # Empty results are not cached
+        service.get_restaurant_context.return_value = ""
+        service._get_social_contexts("sushi")
+        service._get_social_contexts("sushi")
+        assert service.get_event_context.call_count == 4
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_history_rolling_summary(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test older turns are replaced by a background summary once it is ready"""
+        create = mock_groq.return_value.chat.completions.create
+        create.return_value.choices = [MagicMock(message=MagicMock(content="Student asked about CMPE 213."))]
+        
+        service = GroqAcademicService()
+        history = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+            for i in range(10)
+        ]
+        
+        # No summary yet: history is sent verbatim while one is generated for the 6 older messages
+        assert service._history_messages(history) == history
+        service._summary_pool.shutdown(wait=True)
+        assert create.call_args[1]['model'] == "llama-3.1-8b-instant"
+        assert "message 5" in create.call_args[1]['messages'][1]['content']
+        assert "message 6" not in create.call_args[1]['messages'][1]['content']
+        
+        messages = service._history_messages(history + [{"role": "user", "content": "message 10"}])
+        assert messages[0] == {
+            "role": "system",
+            "content": "Summary of the earlier conversation:\nStudent asked about CMPE 213."
+        }
+        assert [msg['content'] for msg in messages[1:]] == [f"message {i}" for i in range(6, 11)]
+        assert create.call_count == 1
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_chat_social_no_context_short_circuit(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test venue lookups with no retrieved context are answered without calling Groq"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[1.0, 0.0]])
+        create = mock_groq.return_value.chat.completions.create
+        create.return_value.choices = [MagicMock(message=MagicMock(content="Hello!"))]
+        
+        service = GroqAcademicService()
+        service.get_restaurant_context = MagicMock(return_value="")
+        service.get_event_context = MagicMock(return_value="")
+        
+        assert service.chat_social("Kampüse yakın kafeler var mı?").startswith("Veritabanımda")
+        assert list(service.chat_social_stream("Any restaurants near campus?"))[0].startswith("I don't have")
+        create.assert_not_called()
+        
+        # Open-ended chit-chat still goes to the model
+        assert service.chat_social("Thanks, have a nice day") == "Hello!"
+        create.assert_called_once()
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_social_system_prompt_language_lock(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test the social prompt pins the reply to the detected language"""
+        service = GroqAcademicService()
+        
+        assert service.create_social_system_prompt('tr').endswith(
+            "Mekan adları, etkinlik adları ve URL'ler olduğu gibi kalmalı."
+        )
+        assert "Respond ONLY in English" in service.create_social_system_prompt('en')
+        assert "Türkçe" not in service.create_social_system_prompt('en')
+        # The appended lock is the only language directive
+        assert "Always respond in English" not in service.create_social_system_prompt('tr')
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_collection_handles_cached(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test collection handles are resolved once and refreshed after a failed query"""
+        stale = MagicMock()
+        stale.query.side_effect = Exception("Collection does not exist")
+        fresh = MagicMock()
+        fresh.query.return_value = {'ids': [[]], 'metadatas': [[]], 'distances': [[]]}
+        get_collection = mock_chroma.return_value.get_collection
+        get_collection.side_effect = [stale, fresh]
+        
+        service = GroqAcademicService()
+        service._collections["events"] = get_collection("events")
+        
+        service._query_collection("events", query_embeddings=[[0.1]], n_results=5)
+        service._query_collection("events", query_embeddings=[[0.1]], n_results=5)
+        
+        assert get_collection.call_count == 2
+        assert fresh.query.call_count == 2
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_client_language_skips_detection(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test a client-supplied language is used as-is and unknown values fall back to detection"""
+        import numpy as np
+        mock_transformer.return_value.encode.return_value = np.array([[1.0, 0.0]])
+        service = GroqAcademicService()
+        service.get_restaurant_context = MagicMock(return_value="")
+        service.get_event_context = MagicMock(return_value="")
+        
+        with patch.object(service, 'detect_language', return_value='en') as mock_detect:
+            assert service.chat_social("Any cafes near campus?", language='tr').startswith("Veritabanımda")
+            mock_detect.assert_not_called()
+            
+            assert service.chat_social("Any cafes near campus?", language='de').startswith("I don't have")
+            mock_detect.assert_called_once()
+    
+    @patch('app.services.groq_service.Groq')
+    @patch('app.services.groq_service.SentenceTransformer')
+    @patch('app.services.groq_service.chromadb.HttpClient')
+    def test_warm_up(self, mock_chroma, mock_transformer, mock_groq, mock_env_vars):
+        """Test warm-up caches the available collections and tolerates missing ones"""
+        def get_collection(name):
+            if name == "events":
+                raise Exception("Collection not found")
+            return MagicMock(name=name)
+        
+        mock_chroma.return_value.get_collection.side_effect = get_collection
+        
+        service = GroqAcademicService()
+        service.get_project_context = MagicMock(return_value="SAGE")
+        service.warm_up()
+        
+        assert set(service._collections) == {"tedu_courses", "venues"}
+        service.get_project_context.assert_called_once()
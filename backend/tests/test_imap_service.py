@@ -3,8 +3,52 @@ Unit tests for IMAP Email Service
 """
 import pytest
 from unittest.mock import Mock, MagicMock, patch
-from app.services.imap_email_service import IMAPEmailService
+from app.services.imap_email_service import (
+    IMAPEmailService, _rate_limit_wait, _search_criteria, _strip_boilerplate
+)
 import imaplib
+import json
+import time
+
+
+class FakeRateLimitError(Exception):
+    """Stand-in for groq.RateLimitError carrying response headers"""
+    
+    def __init__(self, headers):
+        super().__init__("rate_limit_exceeded")
+        self.response = MagicMock(headers=headers)
+
+
+def mock_mailbox(connection, subjects, uidvalidity=b'1'):
+    """Serve UID SEARCH/FETCH from {uid: subject}; UID comes first as Gmail sends it"""
+    connection.select.return_value = ('OK', [str(len(subjects)).encode()])
+    connection.response.return_value = ('UIDVALIDITY', [uidvalidity])
+    
+    def uid(command, *args):
+        if command == 'SEARCH':
+            return ('OK', [b' '.join(subjects)])
+        data = []
+        for seq, message_uid in enumerate(args[0].split(b','), 1):
+            header = b'Subject: ' + subjects[message_uid] + b'\r\nFrom: sender@test.com\r\n\r\n'
+            body = b'Body ' + message_uid
+            data.append((b'%d (UID %s BODY[HEADER.FIELDS (SUBJECT FROM)] {%d}' % (seq, message_uid, len(header)), header))
+            data.append((b' BODY[TEXT]<0> {%d}' % len(body), body))
+            data.append(b')')
+        return ('OK', data)
+    
+    connection.uid.side_effect = uid
+
+
+def fetched_message_sets(connection):
+    return [c.args[1] for c in connection.uid.call_args_list if c.args[0] == 'FETCH']
+
+
+class FakeBadRequestError(Exception):
+    """Stand-in for groq.BadRequestError carrying the error body"""
+    
+    def __init__(self, code):
+        super().__init__(f"Error code: 400 - {code}")
+        self.body = {"error": {"code": code}}
 
 
 class TestIMAPEmailService:
@@ -93,12 +137,9 @@ class TestIMAPEmailService:
         # Mock IMAP connection
         mock_connection = MagicMock()
         mock_connection.login.return_value = ('OK', [b'Logged in'])
-        mock_connection.select.return_value = ('OK', [b'10'])
-        mock_connection.search.return_value = ('OK', [b'1 2 3'])
         
         # Mock email data
-        mock_email_data = b'Subject: Test Email\r\nFrom: sender@test.com\r\n\r\nTest body'
-        mock_connection.fetch.return_value = ('OK', [(b'1 (RFC822 {123}', mock_email_data)])
+        mock_mailbox(mock_connection, {b'1': b'Test Email', b'2': b'Other', b'3': b'Third'})
         
         mock_imap.return_value = mock_connection
         
@@ -108,8 +149,75 @@ class TestIMAPEmailService:
         emails = service.fetch_emails(days=7, max_results=10)
         
         assert isinstance(emails, list)
+        assert emails[0]['subject'] == 'Test Email'
         mock_connection.select.assert_called_once_with("INBOX")
-        mock_connection.search.assert_called()
+        assert mock_connection.uid.call_args_list[0].args[0] == 'SEARCH'
+    
+    @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
+    def test_fetch_emails_batched(self, mock_imap):
+        """Test emails are fetched with one message-set command per chunk"""
+        mock_connection = MagicMock()
+        mock_connection.login.return_value = ('OK', [b'Logged in'])
+        mock_mailbox(mock_connection, {b'1': b'Email 1', b'2': b'Email 2', b'3': b'Email 3'})
+        mock_imap.return_value = mock_connection
+        
+        service = IMAPEmailService()
+        service.connect('test@gmail.com', 'password')
+        
+        emails = service.fetch_emails(days=7, max_results=10, batch_size=2)
+        
+        assert [e['id'] for e in emails] == ['1', '2', '3']
+        assert emails[2]['subject'] == 'Email 3'
+        assert emails[2]['body'] == 'Body 3'
+        assert 'full_body' not in emails[2]
+        assert fetched_message_sets(mock_connection) == [b'1,2', b'3']
+        assert 'BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE' in mock_connection.uid.call_args.args[2]
+        assert 'BODY.PEEK[TEXT]<0.4096>' in mock_connection.uid.call_args.args[2]
+    
+    @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
+    def test_fetch_emails_downloads_only_new_mail(self, mock_imap):
+        """Test repeated fetches download only UIDs not seen under the same UIDVALIDITY"""
+        mock_connection = MagicMock()
+        subjects = {b'1': b'Email 1', b'2': b'Email 2'}
+        mock_mailbox(mock_connection, subjects)
+        mock_imap.return_value = mock_connection
+        
+        service = IMAPEmailService()
+        service.connect('test@gmail.com', 'password')
+        service.fetch_emails()
+        
+        subjects[b'3'] = b'Email 3'
+        emails = service.fetch_emails()
+        
+        assert [e['id'] for e in emails] == ['1', '2', '3']
+        assert fetched_message_sets(mock_connection) == [b'1,2', b'3']
+        
+        # A new UIDVALIDITY means old UIDs may name other messages
+        service.connect('test@gmail.com', 'password')
+        mock_mailbox(mock_connection, subjects, uidvalidity=b'2')
+        service.fetch_emails()
+        
+        assert fetched_message_sets(mock_connection)[-1] == b'1,2,3'
+        service.disconnect()
+    
+    def test_parse_email_decodes_text_section(self):
+        """Test single-part and multipart TEXT sections are decoded"""
+        service = IMAPEmailService()
+        
+        header = b'Subject: =?utf-8?q?S=C4=B1nav?=\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: base64\r\n\r\n'
+        # Cut mid-quantum, as the 4 KB cap can do
+        text = b'U8SxbmF2IHlhcsSxbi4='[:-3]
+        parsed = service._parse_email('1', header, text)
+        assert parsed['subject'] == 'Sınav'
+        assert parsed['body'] == 'Sınav yarı'
+        
+        header = b'Subject: Exam\r\nContent-Type: text/plain; charset=iso-8859-9\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n'
+        assert service._parse_email('3', header, b'S=FDnav 09:00')['body'] == 'Sınav 09:00'
+        
+        header = b'Subject: Exam\r\nContent-Type: multipart/mixed; boundary="b"\r\n\r\n'
+        text = (b'--b\r\nContent-Type: text/plain\r\n\r\nExam at 9\r\n'
+                b'--b\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n\r\nJVBERi0')
+        assert service._parse_email('2', header, text)['body'].strip() == 'Exam at 9'
     
     @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
     def test_fetch_emails_connection_expired(self, mock_imap):
@@ -127,6 +235,69 @@ class TestIMAPEmailService:
         
         assert 'Connection expired' in str(exc_info.value)
     
+    @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
+    def test_fetch_emails_selects_inbox_once(self, mock_imap):
+        """Test INBOX is selected once per session, not once per fetch"""
+        mock_connection = MagicMock()
+        mock_mailbox(mock_connection, {})
+        mock_imap.return_value = mock_connection
+        
+        service = IMAPEmailService()
+        service.connect('test@gmail.com', 'password')
+        
+        service.fetch_emails()
+        service.fetch_emails()
+        
+        mock_connection.select.assert_called_once_with("INBOX")
+        assert mock_connection.noop.call_count == 2
+        
+        # A new login starts a new session
+        service.connect('test@gmail.com', 'password')
+        service.fetch_emails()
+        
+        assert mock_connection.select.call_count == 2
+        service.disconnect()
+    
+    @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
+    def test_fetch_emails_reconnects_aborted_session(self, mock_imap):
+        """Test a dropped session logs in again with the cached credentials"""
+        stale = MagicMock()
+        stale.noop.side_effect = imaplib.IMAP4.abort('socket error: EOF')
+        fresh = MagicMock()
+        mock_mailbox(fresh, {})
+        mock_imap.side_effect = [stale, fresh]
+        
+        service = IMAPEmailService()
+        service.connect('test@gmail.com', 'password')
+        
+        emails = service.fetch_emails()
+        
+        assert emails == []
+        assert service.connection is fresh
+        fresh.login.assert_called_once_with('test@gmail.com', 'password')
+        service.disconnect()
+    
+    @patch('app.services.imap_email_service.KEEPALIVE_INTERVAL', 0.01)
+    @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
+    def test_keepalive_sends_noop(self, mock_imap):
+        """Test the keepalive thread pings the server until disconnect"""
+        mock_connection = MagicMock()
+        mock_imap.return_value = mock_connection
+        
+        service = IMAPEmailService()
+        service.connect('test@gmail.com', 'password')
+        
+        for _ in range(100):
+            if mock_connection.noop.called:
+                break
+            time.sleep(0.01)
+        
+        service.disconnect()
+        
+        assert mock_connection.noop.called
+        assert service._keepalive_stop is None
+        assert service._password is None
+    
     @patch('app.services.imap_email_service.imaplib.IMAP4_SSL')
     @patch('app.services.imap_email_service.Groq')
     def test_extract_calendar_events(self, mock_groq, mock_imap):
@@ -152,6 +323,150 @@ class TestIMAPEmailService:
         assert service.is_connected is True
         assert service.email_address == 'test@gmail.com'
     
+    @patch('app.services.imap_email_service.Groq')
+    def test_extract_events_cached_per_batch(self, mock_groq, mock_env_vars):
+        """Test re-extracting the same emails reuses the cached events"""
+        mock_client = MagicMock()
+        mock_completion = MagicMock()
+        mock_completion.choices = [
+            MagicMock(message=MagicMock(content='{"events":[{"title":"Exam","event_date":"2026-01-20 09:00"}]}'))
+        ]
+        mock_client.chat.completions.create.return_value = mock_completion
+        mock_groq.return_value = mock_client
+        
+        service = IMAPEmailService()
+        emails = [{"subject": "Exam", "from": "prof@tedu.edu.tr", "date": "", "body": "Exam on Jan 20"}]
+        
+        first = service.extract_events_with_llm(emails)
+        second = service.extract_events_with_llm(emails)
+        
+        assert first["events"] == second["events"] == [{"title": "Exam", "event_date": "2026-01-20 09:00"}]
+        assert mock_client.chat.completions.create.call_count == 1
+        assert mock_client.chat.completions.create.call_args.kwargs['response_format'] == {"type": "json_object"}
+        
+        # A different batch misses the cache
+        service.extract_events_with_llm([dict(emails[0], body="Exam moved to Jan 21")])
+        assert mock_client.chat.completions.create.call_count == 2
+        
+        # One client serves every call
+        mock_groq.assert_called_once_with(api_key='test_groq_api_key')
+    
+    @patch('app.services.imap_email_service.Groq')
+    def test_extract_events_batches_keep_order(self, mock_groq, mock_env_vars):
+        """Test concurrently processed batches are merged in email order"""
+        def create(**kwargs):
+            subject = kwargs['messages'][1]['content'].split('Subject: ')[1].split('\n')[0]
+            return MagicMock(choices=[MagicMock(message=MagicMock(content=json.dumps({"events": [{"title": subject}]})))])
+        
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = create
+        mock_groq.return_value = mock_client
+        
+        service = IMAPEmailService()
+        emails = [{"subject": f"Event {i}", "from": "a@b.c", "date": "", "body": ""} for i in range(12)]
+        
+        result = service.extract_events_with_llm(emails)
+        
+        assert [e["title"] for e in result["events"]] == ["Event 0", "Event 3", "Event 6", "Event 9"]
+        assert mock_client.chat.completions.create.call_count == 4
+    
+    @patch('app.services.imap_email_service.time.sleep')
+    @patch('app.services.imap_email_service.RateLimitError', FakeRateLimitError)
+    @patch('app.services.imap_email_service.Groq')
+    def test_extract_events_honors_retry_after(self, mock_groq, mock_sleep, mock_env_vars):
+        """Test a rate limited batch waits for Retry-After and retries"""
+        mock_completion = MagicMock()
+        mock_completion.choices = [MagicMock(message=MagicMock(content='{"events": []}'))]
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = [
+            FakeRateLimitError({"retry-after": "2"}),
+            mock_completion
+        ]
+        mock_groq.return_value = mock_client
+        
+        service = IMAPEmailService()
+        result = service.extract_events_with_llm([{"subject": "Exam", "from": "", "date": "", "body": ""}])
+        
+        assert result["success"] is True
+        mock_sleep.assert_called_once_with(2.0)
+        assert mock_client.chat.completions.create.call_count == 2
+    
+    @patch('app.services.imap_email_service.BadRequestError', FakeBadRequestError)
+    @patch('app.services.imap_email_service.RateLimitError', FakeRateLimitError)
+    @patch('app.services.imap_email_service.Groq')
+    def test_extract_events_skips_rejected_batch(self, mock_groq, mock_env_vars):
+        """Test a batch Groq rejects is skipped, uncached, without aborting the others"""
+        good = MagicMock()
+        good.choices = [MagicMock(message=MagicMock(content='{"events": [{"title": "Exam"}]}'))]
+        
+        def create(**kwargs):
+            if 'Broken' in kwargs['messages'][1]['content']:
+                raise FakeBadRequestError("json_validate_failed")
+            return good
+        
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = create
+        mock_groq.return_value = mock_client
+        
+        service = IMAPEmailService()
+        emails = [{"subject": s, "from": "", "date": "", "body": ""}
+                  for s in ("Broken", "x", "y", "Exam", "z", "w")]
+        
+        result = service.extract_events_with_llm(emails)
+        
+        assert result["success"] is True
+        assert result["events"] == [{"title": "Exam"}]
+        assert len(service._event_cache) == 1
+    
+    @patch('app.services.imap_email_service.BadRequestError', FakeBadRequestError)
+    @patch('app.services.imap_email_service.RateLimitError', FakeRateLimitError)
+    @patch('app.services.imap_email_service.Groq')
+    def test_extract_events_propagates_other_api_errors(self, mock_groq, mock_env_vars):
+        """Test errors other than a JSON validation failure fail the extraction"""
+        mock_client = MagicMock()
+        mock_groq.return_value = mock_client
+        service = IMAPEmailService()
+        emails = [{"subject": "Exam", "from": "", "date": "", "body": ""}]
+        
+        for error in (FakeBadRequestError("model_decommissioned"), Exception("401 invalid_api_key")):
+            mock_client.chat.completions.create.side_effect = error
+            with pytest.raises(Exception) as exc_info:
+                service.extract_events_with_llm(emails)
+            assert 'LLM extraction failed' in str(exc_info.value)
+    
+    def test_rate_limit_wait_from_headers(self):
+        """Test backoff falls back from Retry-After to reset headers to the default"""
+        assert _rate_limit_wait(FakeRateLimitError({"retry-after": "600"})) == 120
+        assert _rate_limit_wait(FakeRateLimitError({
+            "x-ratelimit-reset-requests": "2.5s",
+            "x-ratelimit-reset-tokens": "1m0s"
+        })) == pytest.approx(66.0)
+        assert _rate_limit_wait(FakeRateLimitError({})) == 60
+    
+    def test_search_criteria(self):
+        """Test keywords nest into binary ORs and exclude transactional senders only when filtering"""
+        assert _search_criteria('01-Jan-2026', ('exam', 'meeting', 'seminar')) == [
+            'SINCE', '01-Jan-2026',
+            'OR', 'SUBJECT', '"exam"', 'OR', 'SUBJECT', '"meeting"', 'SUBJECT', '"seminar"',
+            'NOT', 'FROM', '"noreply"', 'NOT', 'FROM', '"no-reply"'
+        ]
+        assert _search_criteria('01-Jan-2026', None) == ['SINCE', '01-Jan-2026']
+        assert _search_criteria('01-Jan-2026', ()) == ['SINCE', '01-Jan-2026']
+    
+    def test_strip_boilerplate(self):
+        """Test quoted replies, signatures and long URLs are dropped before the LLM"""
+        body = (
+            "Workshop on Friday at 14:00\n\n"
+            "Join: https://zoom.us/j/12345678901?pwd=abcdefghijklmnopqrstuvwxyz0123456789\n\n"
+            "-- \nProf. X\nTEDU\n"
+        )
+        assert _strip_boilerplate(body) == "Workshop on Friday at 14:00 Join: https://zoom.us"
+        
+        reply = "Sounds good\n\nOn Mon, Jan 5, 2026 at 10:00 AM Ali <ali@tedu.edu.tr>\nwrote:\n> Exam at 9\n> Room B"
+        assert _strip_boilerplate(reply) == "Sounds good"
+        
+        assert _strip_boilerplate("> old line\nnew line") == "new line"
+    
     def test_imap_server_constants(self):
         """Test IMAP server configuration constants"""
         assert IMAPEmailService.IMAP_SERVER == "imap.gmail.com"
@@ -4,6 +4,9 @@
 -- Create extension for UUID generation (optional, for future use)
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Create extension for trigram indexes (substring search on courses)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Create documents table
 CREATE TABLE IF NOT EXISTS documents (
     id SERIAL PRIMARY KEY,
@@ -167,6 +170,10 @@ CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department);
 CREATE INDEX IF NOT EXISTS idx_courses_level ON courses(level);
 CREATE INDEX IF NOT EXISTS idx_courses_prerequisites ON courses USING GIN (prerequisites);
 CREATE INDEX IF NOT EXISTS idx_courses_semesters ON courses USING GIN (offered_semesters);
+-- Serves the keyword fallback search; the expression must match _fallback_course_search
+CREATE INDEX IF NOT EXISTS idx_courses_search_trgm ON courses USING GIN (
+    (coalesce(course_title, '') || ' ' || coalesce(catalog_description, '') || ' ' || course_code) gin_trgm_ops
+);
 
 CREATE TRIGGER update_courses_updated_at BEFORE UPDATE ON courses
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();